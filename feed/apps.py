@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class FeedConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "feed"
+
+    def ready(self):
+        from feed.signals import connect_blob_signals
+
+        connect_blob_signals()
@@ -0,0 +1,95 @@
+from collections import Counter
+from collections.abc import Iterable
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from feed.models import Blob
+from social_media_api.storage import get_blob_storage
+
+# Models and their file fields stored in the content-addressed storage
+BLOB_FIELDS = {
+    "feed.PostImage": ("image",),
+    "feed.PostImageRendition": ("file",),
+    "user.User": ("profile_image",),
+}
+
+# Unreferenced blobs, and files reused by an upload, are kept for a
+# while, so an upload reusing the file is never left without it.
+BLOB_GRACE_PERIOD = timedelta(hours=1)
+
+
+def acquire(names: Iterable[str]) -> None:
+    """Count new references to the stored files."""
+    counts = Counter(name for name in names if name)
+    if not counts:
+        return
+
+    Blob.objects.bulk_create(
+        [Blob(name=name) for name in counts], ignore_conflicts=True
+    )
+
+    for name, count in counts.items():
+        Blob.objects.filter(name=name).update(
+            ref_count=F("ref_count") + count, released_at=None
+        )
+
+
+def release(names: Iterable[str]) -> None:
+    """
+    Count removed references to the stored files. Files without
+    references are deleted later by delete_unreferenced_blobs.
+    """
+    counts = Counter(name for name in names if name)
+
+    for name, count in counts.items():
+        Blob.objects.filter(name=name, ref_count__gte=count).update(
+            ref_count=F("ref_count") - count
+        )
+        Blob.objects.filter(name=name, ref_count=0).update(released_at=now())
+
+
+def delete_unreferenced_blobs(batch_size: int = 500) -> int:
+    """
+    Delete files which lost their last reference more than
+    BLOB_GRACE_PERIOD ago. Returns the number of deleted files.
+    """
+    storage = get_blob_storage()
+    cutoff = now() - BLOB_GRACE_PERIOD
+    num_deleted = 0
+
+    while True:
+        with transaction.atomic():
+            blobs = list(
+                Blob.objects.filter(ref_count=0, released_at__lt=cutoff)
+                .order_by("released_at")
+                .select_for_update(skip_locked=True)[:batch_size]
+            )
+
+            if not blobs:
+                return num_deleted
+
+            deleted_ids = []
+            reused_ids = []
+
+            for blob in blobs:
+                if (
+                    storage.exists(blob.name)
+                    and storage.get_modified_time(blob.name) > cutoff
+                ):
+                    # The file has just been reused by an upload
+                    reused_ids.append(blob.id)
+                    continue
+
+                storage.delete(blob.name)
+                deleted_ids.append(blob.id)
+
+            Blob.objects.filter(id__in=deleted_ids).delete()
+            Blob.objects.filter(id__in=reused_ids).update(released_at=now())
+
+        num_deleted += len(deleted_ids)
+
+        if len(blobs) < batch_size:
+            return num_deleted
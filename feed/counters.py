@@ -0,0 +1,91 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from feed.models import Comment, Like, Post
+
+
+def add_clamped(field: str, delta: int) -> Greatest:
+    """
+    The counter changed by delta, never below zero. A counter which has
+    drifted to zero would otherwise violate its PositiveIntegerField
+    check on decrement.
+    """
+    return Greatest(F(field) + delta, 0)
+
+
+def change_like_count(post_id: int, delta: int) -> None:
+    Post.objects.filter(id=post_id).update(
+        like_count=add_clamped("like_count", delta)
+    )
+
+
+def change_like_counts(deltas: dict[int, int]) -> None:
+    """Change like counters of many posts, one query per distinct delta."""
+    post_ids_by_delta = defaultdict(list)
+    for post_id, delta in deltas.items():
+        if delta:
+            post_ids_by_delta[delta].append(post_id)
+
+    for delta, post_ids in post_ids_by_delta.items():
+        Post.objects.filter(id__in=post_ids).update(
+            like_count=add_clamped("like_count", delta)
+        )
+
+
+def change_comment_count(post_id: int, delta: int) -> None:
+    Post.objects.filter(id=post_id).update(
+        comment_count=add_clamped("comment_count", delta)
+    )
+
+
+def count_subquery(model, field: str) -> Coalesce:
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def reconcile_post_counters(batch_size: int = 1000) -> int:
+    """
+    Recount likes and comments of posts whose counters drifted
+    (e.g. after cascade deletes). Returns the number of repaired posts.
+    """
+    drifted = (
+        Post.objects.annotate(
+            actual_like_count=count_subquery(Like, "post"),
+            actual_comment_count=count_subquery(Comment, "post"),
+        )
+        .filter(
+            ~Q(like_count=F("actual_like_count"))
+            | ~Q(comment_count=F("actual_comment_count"))
+        )
+        .order_by()
+        .values_list("id", "actual_like_count", "actual_comment_count")
+    )
+
+    num_repaired = 0
+    batch = []
+
+    for post_id, like_count, comment_count in drifted.iterator(batch_size):
+        batch.append(
+            Post(
+                id=post_id, like_count=like_count, comment_count=comment_count
+            )
+        )
+
+        if len(batch) == batch_size:
+            Post.objects.bulk_update(batch, ["like_count", "comment_count"])
+            num_repaired += len(batch)
+            batch = []
+
+    if batch:
+        Post.objects.bulk_update(batch, ["like_count", "comment_count"])
+        num_repaired += len(batch)
+
+    return num_repaired
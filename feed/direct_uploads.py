@@ -0,0 +1,127 @@
+import uuid
+from datetime import timedelta
+
+from PIL import Image
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from feed.models import Post, PostImage, post_image_file_path
+from feed.tasks import generate_post_image_renditions
+from social_media_api.storage import (
+    S3BlobStorage,
+    UploadModified,
+    get_blob_storage,
+)
+from social_media_api.uploads import (
+    HEADER_MAX_LENGTH,
+    UploadTooLarge,
+    read_image_size,
+    sniff_image_extension,
+)
+
+UPLOAD_TOKEN_SALT = "feed.direct_uploads"
+
+# Time for the client to upload the file and report its completion
+UPLOAD_TOKEN_MAX_AGE = timedelta(hours=1)
+
+
+def is_enabled() -> bool:
+    """Direct uploads need the images to be stored in a S3 bucket."""
+    return isinstance(get_blob_storage(), S3BlobStorage)
+
+
+def create_upload(post: Post, content_type: str) -> dict:
+    """
+    Presign an upload of an image of the post straight to the bucket.
+    Returns the upload form and the token completing the upload.
+    """
+    key = f"incoming/{post.id}/{uuid.uuid4()}"
+    upload = get_blob_storage().presign_upload(
+        key,
+        content_type,
+        max_size=settings.IMAGE_UPLOAD_MAX_SIZE,
+        expires=settings.DIRECT_UPLOAD_EXPIRES,
+    )
+    token = signing.dumps(
+        {"post": post.id, "key": key}, salt=UPLOAD_TOKEN_SALT
+    )
+
+    return {"url": upload["url"], "fields": upload["fields"], "token": token}
+
+
+def complete_upload(post: Post, token: str) -> PostImage:
+    """
+    Check the image uploaded with the token, as ImageUploadHandler checks
+    streamed uploads, and add it to the post.
+    """
+    try:
+        data = signing.loads(
+            token, salt=UPLOAD_TOKEN_SALT, max_age=UPLOAD_TOKEN_MAX_AGE
+        )
+    except signing.BadSignature:
+        raise ValidationError({"token": ["Invalid upload token."]})
+
+    if data["post"] != post.id:
+        raise ValidationError({"token": ["Invalid upload token."]})
+
+    storage = get_blob_storage()
+    key = data["key"]
+
+    if not storage.exists(key):
+        raise ValidationError({"token": ["The file was not uploaded."]})
+
+    extension, etag = check_image(storage, key)
+
+    image = PostImage(post=post)
+    try:
+        name = storage.import_upload(
+            key, post_image_file_path(image, f"image.{extension}"), etag
+        )
+    except UploadModified:
+        storage.delete(key)
+        raise ValidationError(
+            {"image": ["The file was modified while being processed."]}
+        )
+
+    with transaction.atomic():
+        image.image = name
+        image.save()
+        transaction.on_commit(
+            lambda: generate_post_image_renditions.delay(image.id)
+        )
+
+    return image
+
+
+def check_image(storage: S3BlobStorage, key: str) -> tuple[str, str]:
+    """
+    Check the uploaded object is an image within the size and pixel
+    limits, reading its header only. Returns the extension of the image
+    format and the ETag of the checked object.
+    """
+    header, size, etag = storage.read_range(key, HEADER_MAX_LENGTH)
+
+    if size > settings.IMAGE_UPLOAD_MAX_SIZE:
+        storage.delete(key)
+        raise UploadTooLarge()
+
+    extension = sniff_image_extension(header)
+
+    try:
+        size = read_image_size(header) if extension else None
+    except Image.DecompressionBombError:
+        storage.delete(key)
+        raise ValidationError({"image": ["Image has too many pixels."]})
+
+    if size is None:
+        storage.delete(key)
+        raise ValidationError({"image": ["Upload a valid image."]})
+
+    width, height = size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        storage.delete(key)
+        raise ValidationError({"image": ["Image has too many pixels."]})
+
+    return extension, etag
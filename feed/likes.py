@@ -0,0 +1,263 @@
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from redis.exceptions import LockNotOwnedError, ResponseError
+
+from feed.counters import change_like_count, change_like_counts
+from feed.models import Like, Post
+from social_media_api.redis_client import get_redis
+
+LIKE_BUFFER_KEY = "likes:buffer"
+LIKE_FLUSHING_KEY = "likes:buffer:flushing"
+
+# States the toggles of the flushing batch are resolved to. Saving a
+# state twice changes nothing, unlike applying a toggle twice.
+LIKED = "liked"
+UNLIKED = "unliked"
+
+# Held while the buffer is flushed, renewed before every chunk
+LIKE_FLUSH_LOCK_KEY = "likes:buffer:lock"
+LIKE_FLUSH_LOCK_TIMEOUT = 60
+
+
+def toggle_like(user_id: int, post_id: int) -> bool:
+    """
+    Like the post or remove the existing like.
+    Returns whether the post is liked by the user after the toggle.
+    """
+    if settings.LIKE_WRITE_BEHIND:
+        return toggle_buffered_like(user_id, post_id)
+
+    with transaction.atomic():
+        num_deleted, _ = Like.objects.filter(
+            user_id=user_id, post_id=post_id
+        ).delete()
+
+        if num_deleted:
+            change_like_count(post_id, -1)
+            return False
+
+        try:
+            with transaction.atomic():
+                Like.objects.create(user_id=user_id, post_id=post_id)
+        except IntegrityError:
+            # A concurrent toggle (e.g. a double-tap) has liked the post
+            return True
+
+        change_like_count(post_id, 1)
+        return True
+
+
+def toggle_buffered_like(user_id: int, post_id: int) -> bool:
+    """
+    Count the toggle in the like buffer, which is persisted to the
+    database in batches by the flush_like_buffer task.
+
+    The buffer holds the number of toggles of every like, incremented
+    atomically, so concurrent toggles are never lost. The flush applies
+    the parity of the number to the state found in the database.
+    """
+    redis = get_redis()
+    field = f"{user_id}:{post_id}"
+
+    num_toggles = redis.hincrby(LIKE_BUFFER_KEY, field, 1)
+
+    # The returned state is only a guess while a flush is committed.
+    # The batch being flushed is not in the database yet.
+    flushing = redis.hget(LIKE_FLUSHING_KEY, field)
+
+    if flushing in (LIKED, UNLIKED):
+        is_liked = flushing == LIKED
+    else:
+        is_liked = Like.objects.filter(
+            user_id=user_id, post_id=post_id
+        ).exists()
+        num_toggles += int(flushing or 0)
+
+    return is_liked != bool(num_toggles % 2)
+
+
+def flush_like_buffer(batch_size: int = 500) -> int:
+    """
+    Persist buffered toggles and apply them to the like counters.
+    Returns the number of added and removed likes.
+
+    The toggles of the batch are first resolved to the states of the
+    likes, which are then saved in chunks, each removed from the batch
+    once committed. A batch left by a failed flush is flushed again
+    without applying any of its toggles twice.
+    """
+    redis = get_redis()
+    lock = redis.lock(
+        LIKE_FLUSH_LOCK_KEY, timeout=LIKE_FLUSH_LOCK_TIMEOUT, blocking=False
+    )
+
+    if not lock.acquire():
+        return 0
+
+    num_changed = 0
+
+    try:
+        # A batch left by a failed flush is persisted before newer
+        # toggles. Otherwise new toggles keep landing in a fresh buffer
+        # while this one is saved.
+        if not redis.exists(LIKE_FLUSHING_KEY):
+            try:
+                redis.rename(LIKE_BUFFER_KEY, LIKE_FLUSHING_KEY)
+            except ResponseError:
+                return 0
+
+        states = resolve_toggles(redis, batch_size)
+        fields = list(states)
+
+        for start in range(0, len(fields), batch_size):
+            # Stops the flush if the lock has expired meanwhile
+            lock.reacquire()
+
+            chunk = {
+                field: states[field]
+                for field in fields[start : start + batch_size]
+            }
+            num_changed += persist_likes(chunk)
+            redis.hdel(LIKE_FLUSHING_KEY, *chunk)
+    except LockNotOwnedError:
+        # The batch is left to the flush holding the lock now
+        return num_changed
+    finally:
+        try:
+            lock.release()
+        except LockNotOwnedError:
+            pass
+
+    return num_changed
+
+
+def resolve_toggles(redis, batch_size: int) -> dict[str, str]:
+    """
+    Replace the toggle counts of the flushing batch with the states the
+    likes end up in, and return the states of the whole batch.
+    """
+    batch = redis.hgetall(LIKE_FLUSHING_KEY)
+    states = {
+        field: value
+        for field, value in batch.items()
+        if value in (LIKED, UNLIKED)
+    }
+    counts = {
+        field: int(value)
+        for field, value in batch.items()
+        if field not in states
+    }
+
+    # An even number of toggles leaves the like as it is
+    unchanged = [field for field, count in counts.items() if not count % 2]
+    if unchanged:
+        redis.hdel(LIKE_FLUSHING_KEY, *unchanged)
+
+    toggled = [
+        parse_field(field) for field, count in counts.items() if count % 2
+    ]
+    liked = get_liked(toggled, batch_size)
+    resolved = {
+        f"{user_id}:{post_id}": (
+            UNLIKED if (user_id, post_id) in liked else LIKED
+        )
+        for user_id, post_id in toggled
+    }
+
+    # All counts are replaced in one command, none is resolved twice
+    if resolved:
+        redis.hset(LIKE_FLUSHING_KEY, mapping=resolved)
+
+    return states | resolved
+
+
+def persist_likes(states: dict[str, str]) -> int:
+    """Save the states of the likes and apply them to the counters."""
+    pairs = {parse_field(field): state for field, state in states.items()}
+
+    with transaction.atomic():
+        # Concurrent flushes of the same likes are serialized, so every
+        # change is counted once.
+        existing_post_ids = set(
+            Post.objects.filter(id__in={post_id for _, post_id in pairs})
+            .order_by("id")
+            .select_for_update()
+            .values_list("id", flat=True)
+        )
+        existing_user_ids = set(
+            get_user_model()
+            .objects.filter(id__in={user_id for user_id, _ in pairs})
+            .values_list("id", flat=True)
+        )
+        liked = get_liked(pairs, len(pairs))
+
+        # Likes of posts and users deleted meanwhile are dropped
+        likes = [
+            (user_id, post_id)
+            for (user_id, post_id), state in pairs.items()
+            if state == LIKED
+            and (user_id, post_id) not in liked
+            and post_id in existing_post_ids
+            and user_id in existing_user_ids
+        ]
+        unlikes = [
+            pair
+            for pair, state in pairs.items()
+            if state == UNLIKED and pair in liked
+        ]
+
+        Like.objects.bulk_create(
+            [
+                Like(user_id=user_id, post_id=post_id)
+                for user_id, post_id in likes
+            ],
+            ignore_conflicts=True,
+        )
+
+        if unlikes:
+            Like.objects.filter(filter_pairs(unlikes)).delete()
+
+        # Counters get the net change of the chunk, their drift is
+        # repaired by reconcile_post_counters.
+        deltas = defaultdict(int)
+        for _, post_id in likes:
+            deltas[post_id] += 1
+        for _, post_id in unlikes:
+            deltas[post_id] -= 1
+
+        change_like_counts(deltas)
+
+    return len(likes) + len(unlikes)
+
+
+def get_liked(pairs, batch_size: int) -> set[tuple[int, int]]:
+    """The (user_id, post_id) pairs of pairs which are liked."""
+    pairs = list(pairs)
+    liked = set()
+
+    for start in range(0, len(pairs), batch_size):
+        liked.update(
+            Like.objects.filter(
+                filter_pairs(pairs[start : start + batch_size])
+            ).values_list("user_id", "post_id")
+        )
+
+    return liked
+
+
+def filter_pairs(pairs) -> Q:
+    return reduce(
+        or_,
+        (Q(user_id=user_id, post_id=post_id) for user_id, post_id in pairs),
+    )
+
+
+def parse_field(field: str) -> tuple[int, int]:
+    user_id, post_id = map(int, field.split(":"))
+    return user_id, post_id
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from feed.timeline import backfill_all
+
+
+class Command(BaseCommand):
+    """Django command to fill timelines once from existing follows"""
+
+    def handle(self, *args, **options):
+        self.stdout.write("Backfilling timelines...")
+        num_added = backfill_all()
+        self.stdout.write(
+            self.style.SUCCESS(f"Added {num_added} timeline entries.")
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from feed.counters import reconcile_post_counters
+
+
+class Command(BaseCommand):
+    """Django command to repair drifted like and comment counters"""
+
+    def handle(self, *args, **options):
+        self.stdout.write("Reconciling post counters...")
+        num_repaired = reconcile_post_counters()
+        self.stdout.write(
+            self.style.SUCCESS(f"Repaired counters of {num_repaired} posts.")
+        )
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from feed import timeline
+
+
+class Command(BaseCommand):
+    """Django command to display push/pull timeline counters"""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Reset the counters after displaying them.",
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            "Fan-out follower threshold: "
+            f"{settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD}"
+        )
+
+        for name, value in timeline.get_stats().items():
+            self.stdout.write(f"{name}: {value}")
+
+        if options["reset"]:
+            timeline.reset_stats()
+            self.stdout.write(self.style.SUCCESS("Counters reset."))
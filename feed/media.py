@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+
+from feed.models import Post, PostImage, PostImageRendition
+
+PUBLIC = "public"
+PRIVATE = "private"
+
+
+def get_file_visibility(name: str, user) -> str | None:
+    """
+    Whom the stored file may be served to: PUBLIC for everyone, PRIVATE
+    for the requesting user only, or None if the user may not see it.
+
+    Content-addressed files are shared by all uploads of the same
+    content, so a file is public as soon as one of its owners is: a
+    profile image or an image (or rendition) of a published post.
+    Images of postponed posts are only served to their author.
+    """
+    if get_user_model().objects.filter(profile_image=name).exists():
+        return PUBLIC
+
+    # Each owner is looked up by its own indexed file name
+    post_ids = set(
+        PostImage.objects.filter(image=name).values_list("post_id", flat=True)
+    )
+    post_ids.update(
+        PostImageRendition.objects.filter(file=name).values_list(
+            "image__post_id", flat=True
+        )
+    )
+
+    if not post_ids:
+        return None
+
+    posts = Post.objects.filter(id__in=post_ids)
+
+    if posts.filter(is_published=True).exists():
+        return PUBLIC
+
+    if user.is_authenticated and posts.filter(author=user).exists():
+        return PRIVATE
+
+    return None
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:33
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model):
+    counts = (
+        model.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def populate_counters(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    Like = apps.get_model("feed", "Like")
+    Comment = apps.get_model("feed", "Comment")
+
+    Post.objects.update(
+        like_count=count_subquery(Like),
+        comment_count=count_subquery(Comment),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0007_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0008_post_like_count_post_comment_count"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "is_published", "published_at"],
+                name="post_author_published_idx",
+            ),
+        ),
+    ]
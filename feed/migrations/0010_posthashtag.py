@@ -0,0 +1,93 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_publishing_state(apps, schema_editor):
+    Post = apps.get_model("feed", "Post")
+    PostHashtag = apps.get_model("feed", "PostHashtag")
+
+    posts = Post.objects.filter(id=OuterRef("post_id"))
+    PostHashtag.objects.update(
+        published_at=Subquery(posts.values("published_at")[:1]),
+        is_published=Subquery(posts.values("is_published")[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0009_post_author_published_idx"),
+    ]
+
+    operations = [
+        # The link table already exists as the auto-created
+        # through table of Post.hashtags, so only the state changes.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="PostHashtag",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        (
+                            "hashtag",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="feed.hashtag",
+                            ),
+                        ),
+                        (
+                            "post",
+                            models.ForeignKey(
+                                on_delete=django.db.models.deletion.CASCADE,
+                                to="feed.post",
+                            ),
+                        ),
+                    ],
+                    options={
+                        "db_table": "feed_post_hashtags",
+                        "unique_together": {("post", "hashtag")},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name="post",
+                    name="hashtags",
+                    field=models.ManyToManyField(
+                        blank=True,
+                        related_name="posts",
+                        through="feed.PostHashtag",
+                        to="feed.hashtag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="posthashtag",
+            name="published_at",
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name="posthashtag",
+            name="is_published",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.RunPython(copy_publishing_state, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="posthashtag",
+            index=models.Index(
+                fields=["hashtag", "is_published", "-published_at", "-post"],
+                name="post_hashtag_published_idx",
+            ),
+        ),
+    ]
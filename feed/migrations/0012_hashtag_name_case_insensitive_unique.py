@@ -0,0 +1,47 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:43
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def merge_duplicate_hashtags(apps, schema_editor):
+    """Merge hashtags differing in case only into the oldest one."""
+    Hashtag = apps.get_model("feed", "Hashtag")
+    PostHashtag = apps.get_model("feed", "PostHashtag")
+
+    kept_hashtags = {}
+    hashtags = Hashtag.objects.annotate(key=Lower("name")).order_by("id")
+
+    for hashtag in hashtags:
+        kept_hashtag = kept_hashtags.setdefault(hashtag.key, hashtag)
+
+        if kept_hashtag.id == hashtag.id:
+            continue
+
+        tagged_post_ids = PostHashtag.objects.filter(
+            hashtag=kept_hashtag
+        ).values("post_id")
+        PostHashtag.objects.filter(hashtag=hashtag).exclude(
+            post_id__in=tagged_post_ids
+        ).update(hashtag=kept_hashtag)
+        hashtag.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0011_hot_query_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_hashtags, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="hashtag",
+            constraint=models.UniqueConstraint(
+                Lower("name"),
+                name="hashtag_name_case_insensitive_unique",
+            ),
+        ),
+    ]
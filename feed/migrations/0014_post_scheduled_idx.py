@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0013_like_created_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("is_published", False)),
+                fields=["published_at"],
+                name="post_scheduled_idx",
+            ),
+        ),
+    ]
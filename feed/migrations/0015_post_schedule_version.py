@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0014_post_scheduled_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="schedule_version",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.0.2 on 2026-10-17 05:02
+
+import django.db.models.deletion
+import feed.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0015_post_schedule_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PostImageRendition",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("thumbnail", "Thumbnail"),
+                            ("feed", "Feed"),
+                            ("full", "Full"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "file",
+                    models.ImageField(
+                        upload_to=feed.models.post_image_rendition_file_path
+                    ),
+                ),
+                ("width", models.PositiveIntegerField()),
+                ("height", models.PositiveIntegerField()),
+                (
+                    "image",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="renditions",
+                        to="feed.postimage",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("image", "kind")},
+            },
+        ),
+    ]
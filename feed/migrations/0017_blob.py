@@ -0,0 +1,83 @@
+# Generated by Django 5.0.2 on 2026-10-17 05:05
+
+import feed.models
+import social_media_api.storage
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def count_blob_references(apps, schema_editor):
+    Blob = apps.get_model("feed", "Blob")
+    file_fields = (
+        (apps.get_model("feed", "PostImage"), "image"),
+        (apps.get_model("feed", "PostImageRendition"), "file"),
+        (apps.get_model("user", "User"), "profile_image"),
+    )
+
+    counts = Counter()
+    for model, field in file_fields:
+        names = model.objects.exclude(**{field: ""}).exclude(
+            **{f"{field}__isnull": True}
+        )
+        counts.update(names.values_list(field, flat=True).iterator())
+
+    Blob.objects.bulk_create(
+        [Blob(name=name, ref_count=count) for name, count in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0016_postimagerendition"),
+        ("user", "0008_user_profile_image_blob_storage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="postimage",
+            name="image",
+            field=models.ImageField(
+                db_index=True,
+                storage=social_media_api.storage.get_blob_storage,
+                upload_to=feed.models.post_image_file_path,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="postimagerendition",
+            name="file",
+            field=models.ImageField(
+                storage=social_media_api.storage.get_blob_storage,
+                upload_to=feed.models.post_image_rendition_file_path,
+            ),
+        ),
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("released_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("ref_count", 0)),
+                        fields=["released_at"],
+                        name="blob_unreferenced_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(count_blob_references, migrations.RunPython.noop),
+    ]
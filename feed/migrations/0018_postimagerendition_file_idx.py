@@ -0,0 +1,24 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:00
+
+import feed.models
+import social_media_api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("feed", "0017_blob"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="postimagerendition",
+            name="file",
+            field=models.ImageField(
+                db_index=True,
+                storage=social_media_api.storage.get_blob_storage,
+                upload_to=feed.models.post_image_rendition_file_path,
+            ),
+        ),
+    ]
@@ -3,12 +3,58 @@ import uuid
 
 from django.contrib.auth import get_user_model
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
+from django.db.models.functions import Lower
 from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.timezone import now
 from rest_framework.exceptions import ValidationError
 
+from social_media_api.storage import get_blob_storage
+
+
+class HashtagManager(models.Manager):
+    def get_or_create_many(self, names) -> list["Hashtag"]:
+        """
+        Resolve hashtag names to hashtags, creating the missing ones,
+        in a constant number of queries. Names are matched ignoring case.
+
+        Must be called in a transaction. The hashtags stay locked until
+        it ends, so delete_orphan_hashtags skips them while they are
+        linked to a post.
+        """
+        names_by_key = {}
+        for name in names:
+            names_by_key.setdefault(name.lower(), name)
+
+        if not names_by_key:
+            return []
+
+        hashtags = self.get_by_keys(names_by_key)
+        missing_keys = names_by_key.keys() - hashtags.keys()
+
+        while missing_keys:
+            self.bulk_create(
+                [self.model(name=names_by_key[key]) for key in missing_keys],
+                ignore_conflicts=True,
+            )
+            # Ids are not returned for ignored conflicts, and concurrent
+            # requests may have created some of the hashtags meanwhile.
+            # Those may also have been deleted as orphans before being
+            # locked here, and are created again.
+            hashtags.update(self.get_by_keys(missing_keys))
+            missing_keys = names_by_key.keys() - hashtags.keys()
+
+        return list(hashtags.values())
+
+    def get_by_keys(self, keys) -> dict[str, "Hashtag"]:
+        hashtags = (
+            self.select_for_update()
+            .annotate(key=Lower("name"))
+            .filter(key__in=keys)
+        )
+        return {hashtag.key: hashtag for hashtag in hashtags}
+
 
 class Hashtag(models.Model):
     name = models.CharField(
@@ -22,8 +68,15 @@ class Hashtag(models.Model):
         ],
     )
 
+    objects = HashtagManager()
+
     class Meta:
         ordering = ("name",)
+        constraints = [
+            models.UniqueConstraint(
+                Lower("name"), name="hashtag_name_case_insensitive_unique"
+            ),
+        ]
 
     def get_absolute_url(self):
         return reverse("feed:hashtag-detail", kwargs={"pk": self.pk})
@@ -39,13 +92,37 @@ class Post(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     text = models.TextField()
     hashtags = models.ManyToManyField(
-        Hashtag, related_name="posts", blank=True
+        Hashtag, related_name="posts", blank=True, through="PostHashtag"
     )
     published_at = models.DateTimeField(default=now)
     is_published = models.BooleanField(null=False, blank=False, default=True)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    # Incremented whenever the post is rescheduled or published
+    schedule_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ("-published_at",)
+        indexes = [
+            models.Index(
+                fields=("author", "is_published", "published_at"),
+                name="post_author_published_idx",
+            ),
+            models.Index(
+                fields=("is_published", "published_at"),
+                name="post_published_idx",
+            ),
+            models.Index(
+                fields=("author", "published_at"),
+                condition=models.Q(is_published=False),
+                name="post_postponed_idx",
+            ),
+            models.Index(
+                fields=("published_at",),
+                condition=models.Q(is_published=False),
+                name="post_scheduled_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Post created by {self.author} at {self.published_at}"
@@ -61,23 +138,107 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse("feed:post-detail", kwargs={"pk": self.pk})
 
+    def get_hashtag_link_defaults(self) -> dict:
+        return {
+            "published_at": self.published_at,
+            "is_published": self.is_published,
+        }
+
+    def add_hashtags(self, hashtags) -> None:
+        PostHashtag.objects.bulk_create(
+            [
+                PostHashtag(
+                    post=self,
+                    hashtag=hashtag,
+                    **self.get_hashtag_link_defaults(),
+                )
+                for hashtag in hashtags
+            ],
+            ignore_conflicts=True,
+        )
+
+    def sync_hashtag_links(self) -> None:
+        """Copy publishing state of the post to its hashtag links."""
+        PostHashtag.objects.filter(post=self).update(
+            **self.get_hashtag_link_defaults()
+        )
+
+    def bump_schedule_version(self) -> None:
+        """
+        Claim the postponed post for rescheduling. The row stays locked
+        until the end of the transaction, and the claim fails if the post
+        has been published or rescheduled since it was loaded.
+        """
+        num_updated = Post.objects.filter(
+            id=self.id,
+            is_published=False,
+            schedule_version=self.schedule_version,
+        ).update(schedule_version=models.F("schedule_version") + 1)
+
+        if not num_updated:
+            raise ValidationError(
+                "Post has been published or rescheduled meanwhile."
+            )
+
+        self.schedule_version += 1
+
     def publish(self):
-        if self.is_published:
+        published_at = now()
+
+        # Conditional update makes publishing exactly-once under races
+        num_updated = Post.objects.filter(
+            id=self.id, is_published=False
+        ).update(
+            is_published=True,
+            published_at=published_at,
+            schedule_version=models.F("schedule_version") + 1,
+        )
+
+        if not num_updated:
             raise ValidationError("Post is already published.")
 
         self.is_published = True
-        self.published_at = now()
+        self.published_at = published_at
+        self.refresh_from_db(fields=["schedule_version"])
+
+        self.sync_hashtag_links()
+
+        # Imported here to avoid a circular import with feed.tasks
+        from feed.tasks import push_post_to_timelines
+
+        transaction.on_commit(lambda: push_post_to_timelines.delay(self.id))
 
-        self.save()
+
+class PostHashtag(models.Model):
+    """
+    Link between a post and a hashtag. It carries a copy of publishing
+    state of the post, so the latest posts with a hashtag are read from
+    the index of this table without joining the posts.
+    """
+
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE)
+    published_at = models.DateTimeField(default=now)
+    is_published = models.BooleanField(default=True)
+
+    class Meta:
+        db_table = "feed_post_hashtags"
+        unique_together = ("post", "hashtag")
+        indexes = [
+            models.Index(
+                fields=("hashtag", "is_published", "-published_at", "-post"),
+                name="post_hashtag_published_idx",
+            ),
+        ]
 
 
 def post_image_file_path(instance, filename) -> str:
-    _, extension = filename.split(".")
+    _, extension = os.path.splitext(filename)
 
     filename = (
         f"{slugify(instance.post.author.username)}_"
         f"{instance.post.published_at.strftime('%Y-%m-%d_%H-%M-%S')}-"
-        f"{uuid.uuid4()}.{extension}"
+        f"{uuid.uuid4()}{extension}"
     )
 
     return os.path.join("uploads/posts/", filename)
@@ -88,9 +249,52 @@ class PostImage(models.Model):
         Post, on_delete=models.CASCADE, related_name="images"
     )
     image = models.ImageField(
-        blank=False, null=False, upload_to=post_image_file_path
+        blank=False,
+        null=False,
+        upload_to=post_image_file_path,
+        storage=get_blob_storage,
+        db_index=True,
     )
 
+    def get_rendition(self, kind: str):
+        """
+        Return the rendition of the given kind, or None while renditions
+        are not generated yet. Reads prefetched renditions if available.
+        """
+        for rendition in self.renditions.all():
+            if rendition.kind == kind:
+                return rendition
+
+        return None
+
+
+def post_image_rendition_file_path(instance, filename) -> str:
+    return os.path.join("uploads/posts/renditions/", filename)
+
+
+class PostImageRendition(models.Model):
+    """A resized copy of a post image, generated by a Celery task."""
+
+    class Kind(models.TextChoices):
+        THUMBNAIL = "thumbnail"
+        FEED = "feed"
+        FULL = "full"
+
+    image = models.ForeignKey(
+        PostImage, on_delete=models.CASCADE, related_name="renditions"
+    )
+    kind = models.CharField(max_length=16, choices=Kind.choices)
+    file = models.ImageField(
+        upload_to=post_image_rendition_file_path,
+        storage=get_blob_storage,
+        db_index=True,
+    )
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        unique_together = ("image", "kind")
+
 
 class Comment(models.Model):
     author = models.ForeignKey(
@@ -104,6 +308,11 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ("created_at",)
+        indexes = [
+            models.Index(
+                fields=("post", "created_at"), name="comment_post_created_idx"
+            ),
+        ]
 
     def __str__(self):
         return f"Comment left by {self.author} to {self.post.author}'s post"
@@ -116,7 +325,64 @@ class Like(models.Model):
     post = models.ForeignKey(
         Post, on_delete=models.CASCADE, related_name="likes"
     )
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ("user__first_name", "user__last_name")
         unique_together = ("user", "post")
+        indexes = [
+            models.Index(fields=("post", "user"), name="like_post_user_idx"),
+            models.Index(
+                fields=("post", "-created_at", "-id"),
+                name="like_post_created_idx",
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    A post pushed to the materialized home timeline of one of the
+    author's followers.
+    """
+
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name="timeline_entries",
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    published_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ("-published_at", "-post_id")
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=("user", "-published_at", "-post"),
+                name="timeline_user_published_idx",
+            ),
+        ]
+
+
+class Blob(models.Model):
+    """
+    A content-addressed file, shared by all file fields referencing it.
+    Files left without references are deleted by a periodic task.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    released_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=("released_at",),
+                condition=models.Q(ref_count=0),
+                name="blob_unreferenced_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,216 @@
+import base64
+import binascii
+import json
+
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def apply_keyset(
+    queryset: QuerySet, ordering: tuple[str, str], position: tuple | None
+) -> QuerySet:
+    """
+    Order queryset by a (timestamp, id) keyset and select rows
+    placed after `position`.
+    """
+    queryset = queryset.order_by(*ordering)
+
+    if position is None:
+        return queryset
+
+    timestamp_field, pk_field = (field.lstrip("-") for field in ordering)
+    timestamp, pk = position
+    lookup = "lt" if ordering[0].startswith("-") else "gt"
+
+    return queryset.filter(
+        Q(**{f"{timestamp_field}__{lookup}": timestamp})
+        | Q(**{timestamp_field: timestamp, f"{pk_field}__{lookup}": pk})
+    )
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination over a (timestamp, id) keyset.
+
+    The cursor holds the position of the last item of the page, so the
+    next page is fetched with a range condition on an index instead of
+    an OFFSET scan, and no COUNT(*) query is ever run.
+    """
+
+    page_size = 25
+    max_page_size = 100
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    # A timestamp field followed by a unique tie-breaker,
+    # both sorted in the same direction.
+    ordering = ("-published_at", "-id")
+
+    # URL of the paginated endpoint, if it differs from the request URL
+    url = None
+
+    def get_page_size(self, request) -> int:
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        if page_size <= 0:
+            return self.page_size
+
+        return min(page_size, self.max_page_size)
+
+    @property
+    def fields(self) -> tuple[str, str]:
+        return tuple(field.lstrip("-") for field in self.ordering)
+
+    def encode_cursor(self, position: tuple) -> str:
+        timestamp, pk = position
+        data = json.dumps([timestamp.isoformat(), pk])
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, request) -> tuple | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if not encoded:
+            return None
+
+        try:
+            data = base64.urlsafe_b64decode(encoded.encode()).decode()
+            timestamp, pk = json.loads(data)
+            timestamp = parse_datetime(timestamp)
+            pk = int(pk)
+        except (binascii.Error, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+        if timestamp is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return timestamp, pk
+
+    def get_position(self, item) -> tuple:
+        return tuple(getattr(item, field) for field in self.fields)
+
+    def filter_queryset(self, queryset: QuerySet, position) -> QuerySet:
+        return apply_keyset(queryset, self.ordering, position)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate(
+            lambda position, limit: self.filter_queryset(queryset, position)[
+                :limit
+            ],
+            request,
+        )
+
+    def paginate_first_page(self, queryset, request, url: str) -> list:
+        """
+        Return the first page of queryset, e.g. to embed it into another
+        resource, with the next page link pointing to `url`.
+        """
+        self.url = url
+        return self.get_page(
+            lambda position, limit: self.filter_queryset(queryset, position)[
+                :limit
+            ],
+            request,
+            position=None,
+        )
+
+    def paginate(self, fetch, request) -> list:
+        """
+        Paginate any ordered source.
+
+        `fetch(position, limit)` must return up to `limit` items placed
+        after `position` (or from the start if it is None) in the
+        pagination ordering.
+        """
+        return self.get_page(fetch, request, self.decode_cursor(request))
+
+    def get_page(self, fetch, request, position: tuple | None) -> list:
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        items = list(fetch(position, page_size + 1))
+        self.has_next = len(items) > page_size
+        items = items[:page_size]
+
+        self.next_position = (
+            self.get_position(items[-1]) if self.has_next else None
+        )
+
+        return items
+
+    def get_next_link(self) -> str | None:
+        if self.next_position is None:
+            return None
+
+        url = self.url or self.request.build_absolute_uri()
+        return replace_query_param(
+            url,
+            self.cursor_query_param,
+            self.encode_cursor(self.next_position),
+        )
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {
+                    "type": "string",
+                    "nullable": True,
+                    "format": "uri",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+
+class PostPagination(KeysetPagination):
+    ordering = ("-published_at", "-id")
+
+
+class PostponedPostPagination(KeysetPagination):
+    ordering = ("published_at", "id")
+
+
+class HashtagPostPagination(KeysetPagination):
+    ordering = ("-published_at", "-post_id")
+
+
+class TimelinePagination(KeysetPagination):
+    ordering = ("-published_at", "-post_id")
+
+
+class LikePagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
+
+
+class FollowPagination(KeysetPagination):
+    ordering = ("-created_at", "-id")
@@ -0,0 +1,169 @@
+import io
+
+from celery import group
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, features
+
+from feed import blobs
+from feed.models import PostImage, PostImageRendition
+
+
+def get_rendition_format() -> tuple[str, str]:
+    """Pillow format and file extension of generated renditions."""
+    if features.check("webp"):
+        return "WEBP", "webp"
+
+    return "JPEG", "jpg"
+
+
+def render(source: Image.Image, size: tuple[int, int]) -> Image.Image:
+    """Scale the image down to fit into size, keeping its aspect ratio."""
+    image = source.copy()
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+
+    image_format, _ = get_rendition_format()
+    has_alpha = image.mode in ("RGBA", "LA", "P")
+
+    if has_alpha and image_format != "JPEG":
+        return image.convert("RGBA")
+
+    return image.convert("RGB")
+
+
+def generate_renditions(post_image_id: int) -> int:
+    """
+    Generate missing renditions of the post image.
+    Returns the number of added renditions.
+
+    Images are rendered without any lock held, so the post image can be
+    edited or deleted meanwhile. The row is only locked to record them.
+    """
+    post_image = PostImage.objects.filter(id=post_image_id).first()
+
+    if post_image is None:
+        return 0
+
+    renditions = get_missing_renditions(post_image)
+
+    if not renditions:
+        return 0
+
+    return record_renditions(post_image_id, renditions)
+
+
+def get_missing_renditions(
+    post_image: PostImage,
+) -> dict[str, PostImageRendition]:
+    existing_kinds = set(post_image.renditions.values_list("kind", flat=True))
+    sizes = {
+        kind: size
+        for kind, size in settings.POST_IMAGE_RENDITION_SIZES.items()
+        if kind not in existing_kinds
+    }
+
+    # Renditions of the same original uploaded before are reused
+    renditions = {
+        rendition.kind: PostImageRendition(
+            image=post_image,
+            kind=rendition.kind,
+            file=rendition.file.name,
+            width=rendition.width,
+            height=rendition.height,
+        )
+        for rendition in PostImageRendition.objects.filter(
+            image__image=post_image.image.name, kind__in=sizes
+        ).exclude(image=post_image)
+    }
+    sizes = {
+        kind: size for kind, size in sizes.items() if kind not in renditions
+    }
+
+    if sizes:
+        renditions.update(render_renditions(post_image, sizes))
+
+    return renditions
+
+
+def record_renditions(
+    post_image_id: int, renditions: dict[str, PostImageRendition]
+) -> int:
+    """
+    Save the renditions the post image still lacks.
+    Returns the number of added renditions.
+    """
+    with transaction.atomic():
+        # Locked, so concurrent runs don't add the same renditions twice
+        is_found = (
+            PostImage.objects.select_for_update()
+            .filter(id=post_image_id)
+            .exists()
+        )
+        existing_kinds = set(
+            PostImageRendition.objects.filter(
+                image_id=post_image_id
+            ).values_list("kind", flat=True)
+        )
+        added = {
+            kind: rendition
+            for kind, rendition in renditions.items()
+            if is_found and kind not in existing_kinds
+        }
+        discarded = [
+            rendition.file.name
+            for kind, rendition in renditions.items()
+            if kind not in added
+        ]
+
+        PostImageRendition.objects.bulk_create(added.values())
+        blobs.acquire(rendition.file.name for rendition in added.values())
+
+        # Files rendered for a deleted image, or by a concurrent run, are
+        # counted as unreferenced, so delete_unreferenced_blobs removes
+        # them unless they are used elsewhere.
+        blobs.acquire(discarded)
+        blobs.release(discarded)
+
+    return len(added)
+
+
+def render_renditions(
+    post_image: PostImage, sizes: dict[str, tuple[int, int]]
+) -> dict[str, PostImageRendition]:
+    image_format, extension = get_rendition_format()
+    renditions = {}
+
+    with post_image.image.open("rb") as file, Image.open(file) as source:
+        source = ImageOps.exif_transpose(source)
+
+        for kind, size in sizes.items():
+            image = render(source, size)
+            content = io.BytesIO()
+            image.save(content, image_format, quality=80)
+
+            rendition = PostImageRendition(
+                image=post_image,
+                kind=kind,
+                width=image.width,
+                height=image.height,
+            )
+            rendition.file.save(
+                f"{kind}.{extension}",
+                ContentFile(content.getvalue()),
+                save=False,
+            )
+            renditions[kind] = rendition
+
+    return renditions
+
+
+def queue_renditions(post_image_ids: list[int]) -> None:
+    """Queue rendition generation of the images with a single group call."""
+    # Imported here to avoid a circular import with feed.tasks
+    from feed.tasks import generate_post_image_renditions
+
+    group(
+        generate_post_image_renditions.s(post_image_id)
+        for post_image_id in post_image_ids
+    ).delay()
@@ -0,0 +1,57 @@
+from celery import group
+from django.db import transaction
+from django.db.models import F
+from django.utils.timezone import now
+
+from feed.models import Post, PostHashtag
+
+
+def publish_due_posts(batch_size: int = 500) -> int:
+    """
+    Publish all postponed posts whose publishing time has come.
+    Returns the number of published posts.
+
+    Due posts are locked with SKIP LOCKED, so several workers running
+    the job at once publish disjoint batches instead of waiting for
+    each other.
+    """
+    num_published = 0
+
+    while True:
+        with transaction.atomic():
+            post_ids = list(
+                Post.objects.filter(
+                    is_published=False, published_at__lte=now()
+                )
+                .order_by("published_at")
+                .select_for_update(skip_locked=True)
+                .values_list("id", flat=True)[:batch_size]
+            )
+
+            if not post_ids:
+                return num_published
+
+            published_at = now()
+            Post.objects.filter(id__in=post_ids).update(
+                is_published=True,
+                published_at=published_at,
+                schedule_version=F("schedule_version") + 1,
+            )
+            PostHashtag.objects.filter(post_id__in=post_ids).update(
+                is_published=True, published_at=published_at
+            )
+
+            transaction.on_commit(lambda: push_posts(post_ids))
+
+        num_published += len(post_ids)
+
+        if len(post_ids) < batch_size:
+            return num_published
+
+
+def push_posts(post_ids: list[int]) -> None:
+    """Fan out published posts to timelines with a single group call."""
+    # Imported here to avoid a circular import with feed.tasks
+    from feed.tasks import push_post_to_timelines
+
+    group(push_post_to_timelines.s(post_id) for post_id in post_ids).delay()
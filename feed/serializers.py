@@ -2,12 +2,21 @@ import datetime
 from zoneinfo import ZoneInfo
 
 from django.core.exceptions import BadRequest
-from django.db import transaction
+from django.db import models, transaction
 from django.urls import reverse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
-from feed.models import Hashtag, Post, PostImage, Comment
+from feed import blobs
+from feed.models import (
+    Hashtag,
+    Post,
+    PostHashtag,
+    PostImage,
+    PostImageRendition,
+    Comment,
+)
+from feed.viewer_state import get_viewer_state
 from social_media_api import settings
 
 
@@ -43,14 +52,15 @@ class PostSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         hashtags_data = validated_data.pop("hashtags", [])
-        post = Post.objects.create(**validated_data)
 
-        for hashtag in hashtags_data:
-            new_hashtag = Hashtag.objects.get_or_create(
-                name=dict(hashtag).get("name")
+        # The hashtags stay locked until the links are committed
+        with transaction.atomic():
+            post = Post.objects.create(**validated_data)
+
+            hashtags = Hashtag.objects.get_or_create_many(
+                hashtag["name"] for hashtag in hashtags_data
             )
-            post.hashtags.add(new_hashtag[0])
-        post.save()
+            post.add_hashtags(hashtags)
 
         return post
 
@@ -62,43 +72,60 @@ class PostSerializer(serializers.ModelSerializer):
             for key, value in validated_data.items():
                 setattr(instance, key, value)
 
-            # Updating hashtags of posts and removing hashtags without posts
-            new_hashtag_names = set(
-                [hashtag["name"] for hashtag in hashtags_data]
-            )
-            old_hashtag_names = set(
-                list(instance.hashtags.values_list("name", flat=True))
-            )
-
-            hashtags_to_add = list(
-                new_hashtag_names.difference(old_hashtag_names)
-            )
-            hashtags_to_remove = list(
-                old_hashtag_names.difference(new_hashtag_names)
+            # Updating hashtags of posts. Hashtags left without posts
+            # are deleted by the delete_orphan_hashtags periodic task.
+            new_hashtag_names = {
+                hashtag["name"].lower(): hashtag["name"]
+                for hashtag in hashtags_data
+            }
+            old_hashtags = {
+                hashtag.name.lower(): hashtag
+                for hashtag in instance.hashtags.all()
+            }
+
+            hashtags_to_add = Hashtag.objects.get_or_create_many(
+                name
+                for key, name in new_hashtag_names.items()
+                if key not in old_hashtags
             )
+            hashtags_to_remove = [
+                hashtag
+                for key, hashtag in old_hashtags.items()
+                if key not in new_hashtag_names
+            ]
 
-            for hashtag in hashtags_to_add:
-                new_hashtag = Hashtag.objects.get_or_create(name=hashtag)
-                instance.hashtags.add(new_hashtag[0])
+            instance.add_hashtags(hashtags_to_add)
 
-            for hashtag in hashtags_to_remove:
-                old_hashtag = Hashtag.objects.get(name=hashtag)
-                related_posts = old_hashtag.posts.all().exclude(id=instance.id)
-                num_posts = related_posts.count()
-
-                if num_posts == 0:
-                    old_hashtag.delete()
-                else:
-                    instance.hashtags.remove(old_hashtag)
+            if hashtags_to_remove:
+                PostHashtag.objects.filter(
+                    post=instance, hashtag__in=hashtags_to_remove
+                ).delete()
 
             instance.save()
+            instance.sync_hashtag_links()
 
             return instance
 
 
 class PostImageListSerializer(serializers.ModelSerializer):
+    image = serializers.SerializerMethodField()
     delete_image_url = serializers.SerializerMethodField()
 
+    # Renditions are generated asynchronously after the upload,
+    # the original image is returned until they are ready.
+    rendition_kind = PostImageRendition.Kind.FEED
+
+    @extend_schema_field(OpenApiTypes.URI)
+    def get_image(self, instance) -> str:
+        rendition = instance.get_rendition(self.rendition_kind)
+        file = rendition.file if rendition else instance.image
+
+        request = self.context.get("request")
+        if request is not None:
+            return request.build_absolute_uri(file.url)
+
+        return file.url
+
     @staticmethod
     @extend_schema_field(OpenApiTypes.URI_TPL)
     def get_delete_image_url(instance):
@@ -111,15 +138,32 @@ class PostImageListSerializer(serializers.ModelSerializer):
         fields = ("id", "image", "delete_image_url")
 
 
+class PostImageDetailSerializer(PostImageListSerializer):
+    rendition_kind = PostImageRendition.Kind.FULL
+
+
+class PostPageSerializer(serializers.ListSerializer):
+    """Resolves likes of the viewer for the whole page of posts at once."""
+
+    def to_representation(self, data):
+        if isinstance(data, models.manager.BaseManager):
+            data = data.all()
+
+        posts = list(data)
+        get_viewer_state(self.context).resolve_likes(post.id for post in posts)
+
+        return super().to_representation(posts)
+
+
 class PostListSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(many=False)
     author_url = serializers.SerializerMethodField()
     hashtags = serializers.StringRelatedField(many=True)
-    num_likes = serializers.IntegerField()
-    num_comments = serializers.IntegerField()
+    num_likes = serializers.IntegerField(source="like_count")
+    num_comments = serializers.IntegerField(source="comment_count")
     images = PostImageListSerializer(many=True, read_only=True)
     detail_url = serializers.SerializerMethodField(read_only=True)
-    has_like_from_user = serializers.BooleanField()
+    has_like_from_user = serializers.SerializerMethodField()
     like_toggle = serializers.SerializerMethodField()
 
     @staticmethod
@@ -132,6 +176,9 @@ class PostListSerializer(serializers.ModelSerializer):
     def get_detail_url(instance):
         return get_full_url(instance.get_absolute_url())
 
+    def get_has_like_from_user(self, instance) -> bool:
+        return get_viewer_state(self.context).has_liked(instance.id)
+
     @staticmethod
     @extend_schema_field(OpenApiTypes.URI_TPL)
     def get_like_toggle(instance):
@@ -154,14 +201,18 @@ class PostListSerializer(serializers.ModelSerializer):
             "has_like_from_user",
             "like_toggle",
         )
+        list_serializer_class = PostPageSerializer
 
 
 class HashtagDetailSerializer(serializers.ModelSerializer):
-    posts = PostListSerializer(many=True, read_only=True)
+    posts = PostListSerializer(
+        source="first_page_posts", many=True, read_only=True
+    )
+    posts_next_url = serializers.URLField(read_only=True, allow_null=True)
 
     class Meta:
         model = Hashtag
-        fields = ("id", "name", "posts")
+        fields = ("id", "name", "posts", "posts_next_url")
 
 
 class PostponedPostListSerializer(serializers.ModelSerializer):
@@ -192,7 +243,7 @@ class PostponedPostDetailSerializer(PostSerializer):
     hashtags = HashtagListSerializer(
         many=True, read_only=False, required=False
     )
-    images = PostImageListSerializer(many=True, read_only=True)
+    images = PostImageDetailSerializer(many=True, read_only=True)
     image_upload_url = serializers.SerializerMethodField()
 
     @staticmethod
@@ -222,12 +273,20 @@ class PostponedPostDetailSerializer(PostSerializer):
 
             post.is_published = False
             post.save()
+            post.sync_hashtag_links()
 
             return post
 
         else:
             raise BadRequest("Publishing time should be greater than now.")
 
+    def update(self, instance, validated_data):
+        with transaction.atomic():
+            # Fails instead of unpublishing a post published meanwhile
+            instance.bump_schedule_version()
+
+            return super().update(instance, validated_data)
+
 
 class CommentSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField()
@@ -253,11 +312,11 @@ class PostDetailSerializer(serializers.ModelSerializer):
     author = serializers.StringRelatedField(many=False)
     author_url = serializers.SerializerMethodField()
     hashtags = HashtagListSerializer(many=True, read_only=True)
-    num_likes = serializers.IntegerField()
+    num_likes = serializers.IntegerField(source="like_count")
     image_upload_url = serializers.SerializerMethodField()
-    images = PostImageListSerializer(many=True, read_only=True)
+    images = PostImageDetailSerializer(many=True, read_only=True)
     comments = CommentSerializer(many=True, read_only=True)
-    has_like_from_user = serializers.BooleanField()
+    has_like_from_user = serializers.SerializerMethodField()
     like_toggle = serializers.SerializerMethodField()
     users_who_liked_url = serializers.SerializerMethodField()
 
@@ -273,6 +332,9 @@ class PostDetailSerializer(serializers.ModelSerializer):
             reverse("feed:post-image-upload", kwargs={"pk": instance.id})
         )
 
+    def get_has_like_from_user(self, instance) -> bool:
+        return get_viewer_state(self.context).has_liked(instance.id)
+
     @staticmethod
     @extend_schema_field(OpenApiTypes.URI_TPL)
     def get_like_toggle(instance):
@@ -309,3 +371,43 @@ class PostImageSerializer(serializers.ModelSerializer):
     class Meta:
         model = PostImage
         fields = ("id", "image")
+
+
+class PostImageBatchUploadSerializer(serializers.Serializer):
+    images = serializers.ListField(
+        child=serializers.ImageField(),
+        min_length=1,
+        max_length=settings.POST_IMAGE_BATCH_MAX_FILES,
+        write_only=True,
+    )
+
+    def create(self, validated_data):
+        post = validated_data["post"]
+
+        with transaction.atomic():
+            images = PostImage.objects.bulk_create(
+                [
+                    PostImage(post=post, image=image)
+                    for image in validated_data["images"]
+                ]
+            )
+            # bulk_create sends no post_save signals counting references
+            blobs.acquire(image.image.name for image in images)
+
+        return images
+
+
+class PostImagePresignSerializer(serializers.Serializer):
+    content_type = serializers.ChoiceField(
+        choices=["image/jpeg", "image/png", "image/gif", "image/webp"],
+        write_only=True,
+    )
+    url = serializers.URLField(read_only=True)
+    form_fields = serializers.DictField(
+        source="fields", child=serializers.CharField(), read_only=True
+    )
+    token = serializers.CharField(read_only=True)
+
+
+class PostImageUploadCompleteSerializer(serializers.Serializer):
+    token = serializers.CharField()
@@ -0,0 +1,59 @@
+from django.apps import apps
+from django.db.models.signals import post_init, post_save, pre_delete
+
+from feed import blobs
+
+
+def get_file_name(instance, field: str) -> str | None:
+    return getattr(instance, field).name or None
+
+
+def remember_blob_names(sender, instance, **kwargs):
+    """Remember the stored files of a loaded instance."""
+    instance._blob_names = {}
+
+    for field in blobs.BLOB_FIELDS[sender._meta.label]:
+        if instance.pk is None:
+            # Files of new instances are not stored yet
+            instance._blob_names[field] = None
+        elif field in instance.__dict__:
+            # Deferred fields are not written back on save
+            instance._blob_names[field] = get_file_name(instance, field)
+
+
+def count_saved_blobs(sender, instance, update_fields, **kwargs):
+    acquired = []
+    released = []
+
+    for field in blobs.BLOB_FIELDS[sender._meta.label]:
+        if update_fields is not None and field not in update_fields:
+            continue
+        if field not in instance._blob_names:
+            continue
+
+        old_name = instance._blob_names.get(field)
+        new_name = get_file_name(instance, field)
+
+        if old_name != new_name:
+            acquired.append(new_name)
+            released.append(old_name)
+            instance._blob_names[field] = new_name
+
+    blobs.acquire(acquired)
+    blobs.release(released)
+
+
+def count_deleted_blobs(sender, instance, **kwargs):
+    blobs.release(
+        get_file_name(instance, field)
+        for field in blobs.BLOB_FIELDS[sender._meta.label]
+    )
+
+
+def connect_blob_signals() -> None:
+    for label in blobs.BLOB_FIELDS:
+        model = apps.get_model(label)
+
+        post_init.connect(remember_blob_names, sender=model)
+        post_save.connect(count_saved_blobs, sender=model)
+        pre_delete.connect(count_deleted_blobs, sender=model)
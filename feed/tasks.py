@@ -1,9 +1,90 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
 from social_media_api.celery import app
 
-from feed.models import Post
+from feed import blobs, likes, renditions, scheduling, timeline
+from feed.models import Hashtag, Post, PostHashtag
+
+
+@app.task
+def publish_due_posts() -> int:
+    return scheduling.publish_due_posts()
+
+
+@app.task
+def publish_postponed_post(post_id: int) -> int:
+    """
+    Left for ETA tasks enqueued before posts were published in batches
+    by publish_due_posts, it publishes the due posts the same way.
+    """
+    return scheduling.publish_due_posts()
+
+
+@app.task
+def push_post_to_timelines(post_id: int) -> int:
+    post = Post.objects.filter(id=post_id, is_published=True).first()
+
+    if post is None:
+        return 0
+
+    return timeline.push_post(post)
+
+
+@app.task
+def backfill_timeline(follower_id: int, author_id: int) -> None:
+    timeline.backfill(follower_id, author_id)
+
+
+@app.task
+def backfill_followers_timelines(author_id: int) -> int:
+    return timeline.backfill_followers(author_id)
+
+
+@app.task
+def purge_timeline(follower_id: int, author_id: int) -> None:
+    timeline.purge(follower_id, author_id)
+
+
+@app.task
+def delete_orphan_hashtags(batch_size: int = 1000) -> int:
+    """Delete hashtags without posts in chunks of batch_size."""
+    orphans = Hashtag.objects.filter(
+        ~Exists(PostHashtag.objects.filter(hashtag=OuterRef("pk")))
+    ).order_by("id")
+    num_deleted = 0
+
+    while True:
+        with transaction.atomic():
+            # Locked hashtags cannot be linked to posts until the deletion
+            # commits, and the orphan condition is checked again by the
+            # delete, so links committed meanwhile keep their hashtags.
+            ids = list(
+                orphans.select_for_update(skip_locked=True).values_list(
+                    "id", flat=True
+                )[:batch_size]
+            )
+
+            if not ids:
+                return num_deleted
+
+            deleted, _ = orphans.filter(id__in=ids).delete()
+            num_deleted += deleted
+
+        if len(ids) < batch_size:
+            return num_deleted
+
+
+@app.task
+def flush_like_buffer() -> int:
+    return likes.flush_like_buffer()
+
+
+@app.task
+def generate_post_image_renditions(post_image_id: int) -> int:
+    return renditions.generate_renditions(post_image_id)
 
 
 @app.task
-def publish_postponed_post(post_id: int) -> None:
-    post = Post.objects.get(id=post_id)
-    post.publish()
+def delete_unreferenced_blobs() -> int:
+    return blobs.delete_unreferenced_blobs()
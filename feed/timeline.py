@@ -0,0 +1,327 @@
+import heapq
+from datetime import datetime
+from itertools import islice
+
+from celery import group
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+
+from feed.models import Post, TimelineEntry
+from feed.pagination import apply_keyset
+from user import graph
+from user.models import Follow
+
+TIMELINE_ORDERING = ("-published_at", "-post_id")
+POST_ORDERING = ("-published_at", "-id")
+
+# Counters describing how timelines are built:
+# - push_posts: posts fanned out to followers on write;
+# - push_rows: timeline rows written by the fan-out;
+# - pull_posts: posts skipped on write because the author has
+#   too many followers and is pulled at read time instead;
+# - reads: timeline pages read;
+# - pull_reads: timeline pages that merged at least one pulled author;
+# - pulled_authors: author streams merged at read time.
+STATS = (
+    "push_posts",
+    "push_rows",
+    "pull_posts",
+    "reads",
+    "pull_reads",
+    "pulled_authors",
+)
+STATS_KEY_PREFIX = "timeline:stats:"
+
+
+def incr_stat(name: str, delta: int = 1) -> None:
+    key = f"{STATS_KEY_PREFIX}{name}"
+    cache.add(key, 0, timeout=None)
+    cache.incr(key, delta)
+
+
+def get_stats() -> dict[str, int]:
+    values = cache.get_many([f"{STATS_KEY_PREFIX}{name}" for name in STATS])
+    return {name: values.get(f"{STATS_KEY_PREFIX}{name}", 0) for name in STATS}
+
+
+def reset_stats() -> None:
+    cache.delete_many([f"{STATS_KEY_PREFIX}{name}" for name in STATS])
+
+
+def is_pulled_author(author_id: int) -> bool:
+    """Posts of authors with too many followers are pulled at read time."""
+    return (
+        get_user_model()
+        .objects.filter(
+            id=author_id,
+            follower_count__gte=settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD,
+        )
+        .exists()
+    )
+
+
+def get_pulled_author_ids(user) -> list[int]:
+    """Ids of the authors followed by user which are pulled at read time."""
+    authors = get_user_model().objects.filter(
+        follower_count__gte=settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD
+    )
+
+    if graph.is_enabled():
+        authors = authors.filter(id__in=graph.get_following_ids(user.id))
+    else:
+        authors = authors.filter(followers__follower=user)
+
+    return list(authors.values_list("id", flat=True))
+
+
+def push_post(post: Post) -> int:
+    """
+    Copy a published post into the timelines of all author's followers.
+    Returns the number of timelines the post was pushed to.
+    """
+    if is_pulled_author(post.author_id):
+        incr_stat("pull_posts")
+        return 0
+
+    batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+    follower_ids = (
+        Follow.objects.filter(following_id=post.author_id)
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+
+    num_pushed = 0
+    batch = []
+
+    for follower_id in follower_ids:
+        batch.append(
+            TimelineEntry(
+                user_id=follower_id,
+                post_id=post.id,
+                published_at=post.published_at,
+            )
+        )
+
+        if len(batch) == batch_size:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            num_pushed += len(batch)
+            batch = []
+
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        num_pushed += len(batch)
+
+    incr_stat("push_posts")
+    incr_stat("push_rows", num_pushed)
+
+    return num_pushed
+
+
+def lock_follow(follower_id: int, author_id: int) -> bool:
+    """
+    Lock the follow relation until the end of the transaction.
+    Returns whether the follower still follows the author.
+
+    Backfill and purge tasks of a quick follow and unfollow may run in
+    any order, so both act on the current relation only. The lock keeps
+    it from changing while the timeline is updated.
+    """
+    return (
+        Follow.objects.select_for_update()
+        .filter(follower_id=follower_id, following_id=author_id)
+        .exists()
+    )
+
+
+def get_backfill_posts(author_id: int) -> list[tuple[int, datetime]]:
+    return list(
+        Post.objects.filter(author_id=author_id, is_published=True)
+        .order_by(*POST_ORDERING)
+        .values_list("id", "published_at")[: settings.TIMELINE_BACKFILL_SIZE]
+    )
+
+
+def backfill(follower_id: int, author_id: int) -> None:
+    """Push the latest posts of a newly followed author to the timeline."""
+    if is_pulled_author(author_id):
+        return
+
+    with transaction.atomic():
+        if not lock_follow(follower_id, author_id):
+            return
+
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(
+                    user_id=follower_id,
+                    post_id=post_id,
+                    published_at=published_at,
+                )
+                for post_id, published_at in get_backfill_posts(author_id)
+            ],
+            ignore_conflicts=True,
+        )
+
+
+def queue_backfills(follower_id: int, author_ids: list[int]) -> None:
+    """Queue backfills of newly followed authors with a single group call."""
+    # Imported here to avoid a circular import with feed.tasks
+    from feed.tasks import backfill_timeline
+
+    group(
+        backfill_timeline.s(follower_id, author_id) for author_id in author_ids
+    ).delay()
+
+
+def backfill_all(batch_size: int = 1000) -> int:
+    """
+    Push the latest posts of every pushed author to the timelines of all
+    their followers, e.g. to fill timelines of existing follow relations.
+    Returns the number of added timeline rows.
+    """
+    author_ids = (
+        get_user_model()
+        .objects.filter(
+            follower_count__lt=settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD,
+            posts__is_published=True,
+        )
+        .distinct()
+        .values_list("id", flat=True)
+    )
+
+    return sum(
+        backfill_followers(author_id, batch_size)
+        for author_id in author_ids.iterator(chunk_size=batch_size)
+    )
+
+
+def backfill_followers(author_id: int, batch_size: int = 1000) -> int:
+    """
+    Push the latest posts of the author to the timelines of all their
+    followers, e.g. once the author is no longer pulled at read time.
+    Returns the number of added timeline rows.
+    """
+    if is_pulled_author(author_id):
+        return 0
+
+    posts = get_backfill_posts(author_id)
+    if not posts:
+        return 0
+
+    follower_ids = (
+        Follow.objects.filter(following_id=author_id)
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=batch_size)
+    )
+
+    # Every follower gets all the posts, batches hold whole followers
+    followers_per_batch = max(batch_size // len(posts), 1)
+    num_added = 0
+    batch = []
+
+    for follower_id in follower_ids:
+        batch.append(follower_id)
+
+        if len(batch) == followers_per_batch:
+            num_added += add_timeline_posts(batch, posts)
+            batch = []
+
+    if batch:
+        num_added += add_timeline_posts(batch, posts)
+
+    return num_added
+
+
+def add_timeline_posts(
+    user_ids: list[int], posts: list[tuple[int, datetime]]
+) -> int:
+    """
+    Add the posts to the timelines of the users, skipping the entries
+    they already have. Returns the number of added timeline rows.
+    """
+    existing = set(
+        TimelineEntry.objects.filter(
+            user_id__in=user_ids, post_id__in=[post_id for post_id, _ in posts]
+        ).values_list("user_id", "post_id")
+    )
+    entries = [
+        TimelineEntry(
+            user_id=user_id, post_id=post_id, published_at=published_at
+        )
+        for user_id in user_ids
+        for post_id, published_at in posts
+        if (user_id, post_id) not in existing
+    ]
+
+    # Entries pushed by a concurrent fan-out are still skipped here
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+    return len(entries)
+
+
+def is_demoted(follower_count_before: int, follower_count: int) -> bool:
+    """
+    Whether the author stopped being pulled at read time. Their posts
+    of the pulled era were never pushed and must be backfilled.
+    """
+    threshold = settings.TIMELINE_FANOUT_FOLLOWER_THRESHOLD
+    return follower_count_before >= threshold > follower_count
+
+
+def purge(follower_id: int, author_id: int) -> None:
+    """Remove posts of an un-followed author from the timeline."""
+    with transaction.atomic():
+        # The author may have been followed again meanwhile
+        if lock_follow(follower_id, author_id):
+            return
+
+        TimelineEntry.objects.filter(
+            user_id=follower_id, post__author_id=author_id
+        ).delete()
+
+
+def read(user, position: tuple | None, limit: int) -> list[TimelineEntry]:
+    """
+    Read up to `limit` timeline entries placed after `position`.
+
+    Entries pushed on write are k-way merged on `published_at` with the
+    posts of followed authors which are pulled at read time, so the cost
+    depends on the page size and the number of pulled authors only.
+    """
+    pulled_author_ids = get_pulled_author_ids(user)
+
+    pushed = TimelineEntry.objects.filter(user=user)
+    if pulled_author_ids:
+        # Authors may have been pushed before they crossed the threshold
+        pushed = pushed.exclude(post__author_id__in=pulled_author_ids)
+
+    streams = [apply_keyset(pushed, TIMELINE_ORDERING, position)[:limit]]
+
+    for author_id in pulled_author_ids:
+        posts = Post.objects.filter(author_id=author_id, is_published=True)
+        posts = apply_keyset(posts, POST_ORDERING, position).values_list(
+            "id", "published_at"
+        )[:limit]
+        streams.append(
+            [
+                TimelineEntry(
+                    user=user, post_id=post_id, published_at=published_at
+                )
+                for post_id, published_at in posts
+            ]
+        )
+
+    entries = heapq.merge(
+        *streams,
+        key=lambda entry: (entry.published_at, entry.post_id),
+        reverse=True,
+    )
+
+    incr_stat("reads")
+    if pulled_author_ids:
+        incr_stat("pull_reads")
+        incr_stat("pulled_authors", len(pulled_author_ids))
+
+    return list(islice(entries, limit))
@@ -7,6 +7,9 @@ from feed.views import (
     ImageDeleteView,
     PostponedPostViewSet,
     PostImageUploadView,
+    PostImageBatchUploadView,
+    PostImagePresignView,
+    PostImageUploadCompleteView,
 )
 
 router = routers.DefaultRouter()
@@ -28,6 +31,21 @@ urlpatterns = [
         PostImageUploadView.as_view(),
         name="post-image-upload",
     ),
+    path(
+        "posts/<int:pk>/upload_images/",
+        PostImageBatchUploadView.as_view(),
+        name="post-image-batch-upload",
+    ),
+    path(
+        "posts/<int:pk>/presign_image/",
+        PostImagePresignView.as_view(),
+        name="post-image-presign",
+    ),
+    path(
+        "posts/<int:pk>/complete_image_upload/",
+        PostImageUploadCompleteView.as_view(),
+        name="post-image-upload-complete",
+    ),
 ]
 
 app_name = "feed"
@@ -0,0 +1,73 @@
+from collections.abc import Iterable
+
+from feed.models import Like
+from user import graph
+
+
+class ViewerState:
+    """
+    Relations of the requesting user to the objects of a response.
+
+    Relations are loaded with one query per page of objects instead of
+    a correlated subquery per row, and are cached for the whole request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self._post_likes = {}
+        self._user_follows = {}
+
+    def resolve_likes(self, post_ids: Iterable[int]) -> None:
+        missing_ids = {
+            post_id for post_id in post_ids if post_id not in self._post_likes
+        }
+        if not missing_ids:
+            return
+
+        liked_ids = set()
+        if self.user.is_authenticated:
+            liked_ids = set(
+                Like.objects.filter(
+                    user=self.user, post_id__in=missing_ids
+                ).values_list("post_id", flat=True)
+            )
+
+        for post_id in missing_ids:
+            self._post_likes[post_id] = post_id in liked_ids
+
+    def mark_liked(self, post_ids: Iterable[int]) -> None:
+        """Record likes which are already known, e.g. on liked posts."""
+        for post_id in post_ids:
+            self._post_likes[post_id] = True
+
+    def has_liked(self, post_id: int) -> bool:
+        self.resolve_likes([post_id])
+        return self._post_likes[post_id]
+
+    def resolve_follows(self, user_ids: Iterable[int]) -> None:
+        missing_ids = {
+            user_id
+            for user_id in user_ids
+            if user_id not in self._user_follows
+        }
+        if not missing_ids:
+            return
+
+        followed_ids = set()
+        if self.user.is_authenticated:
+            followed_ids = graph.filter_followed(self.user.id, missing_ids)
+
+        for user_id in missing_ids:
+            self._user_follows[user_id] = user_id in followed_ids
+
+    def is_following(self, user_id: int) -> bool:
+        self.resolve_follows([user_id])
+        return self._user_follows[user_id]
+
+
+def get_viewer_state(context: dict) -> ViewerState:
+    """Return the viewer state shared by all serializers of a response."""
+    if "viewer_state" not in context:
+        context["viewer_state"] = ViewerState(context["request"].user)
+
+    return context["viewer_state"]
@@ -1,17 +1,29 @@
-from django.contrib.auth import get_user_model
-from django.db.models import Count, Prefetch, Exists, OuterRef, QuerySet
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet, prefetch_related_objects
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, status, generics, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import GenericViewSet
 
-from feed.models import Hashtag, Post, PostImage, Like
+from feed.counters import change_comment_count
+from feed.likes import toggle_like
+from feed.models import Hashtag, Like, Post, PostHashtag, PostImage
+from feed import direct_uploads, renditions
+from feed.pagination import (
+    HashtagPostPagination,
+    LikePagination,
+    PostPagination,
+    PostponedPostPagination,
+    TimelinePagination,
+)
 from feed.serializers import (
     PostSerializer,
     PostListSerializer,
@@ -19,16 +31,26 @@ from feed.serializers import (
     HashtagListSerializer,
     HashtagDetailSerializer,
     PostImageSerializer,
+    PostImageBatchUploadSerializer,
+    PostImagePresignSerializer,
+    PostImageUploadCompleteSerializer,
+    PostImageListSerializer,
     CommentCreateSerializer,
     PostponedPostListSerializer,
     PostponedPostDetailSerializer,
 )
-from feed.tasks import publish_postponed_post
+from feed.tasks import (
+    generate_post_image_renditions,
+    push_post_to_timelines,
+)
+from feed.viewer_state import get_viewer_state
+from feed import timeline
 from social_media_api.permissions import (
     IsAdminOrIfAuthenticatedReadOnly,
     IsPostAuthorUser,
     IsPostAuthorOrIfAuthenticatedReadOnly,
 )
+from social_media_api.uploads import ImageUploadMixin
 from user.serializers import UserInfoListSerializer
 
 
@@ -38,6 +60,16 @@ class Pagination(PageNumberPagination):
     page_size_query_param = "page_size"
 
 
+def order_by_ids(posts, post_ids: list[int]) -> list[Post]:
+    """Restore the order of posts fetched with `id__in` lookup."""
+    positions = {post_id: index for index, post_id in enumerate(post_ids)}
+    return sorted(posts, key=lambda post: positions[post.id])
+
+
+def get_published_hashtag_links(hashtag) -> QuerySet[PostHashtag]:
+    return PostHashtag.objects.filter(hashtag=hashtag, is_published=True)
+
+
 class HashtagViewSet(
     mixins.RetrieveModelMixin,
     mixins.ListModelMixin,
@@ -50,45 +82,68 @@ class HashtagViewSet(
     pagination_class = Pagination
 
     def get_queryset(self):
-        queryset = Hashtag.objects.all()
-
-        if self.action == "retrieve":
-            user = self.request.user
-
-            posts = Prefetch(
-                "posts",
-                queryset=(
-                    Post.objects.all()
-                    .select_related("author")
-                    .prefetch_related(
-                        "hashtags", "likes", "comments", "images"
-                    )
-                    .annotate(
-                        num_likes=Count("likes", distinct=True),
-                        num_comments=Count("comments", distinct=True),
-                        has_like_from_user=Exists(
-                            Like.objects.filter(user=user, post=OuterRef("pk"))
-                        ),
-                    )
-                ),
-            )
-            queryset = queryset.prefetch_related(posts)
-
-        return queryset
+        return Hashtag.objects.all()
 
     def get_serializer_class(self):
         if self.action == "retrieve":
             return HashtagDetailSerializer
 
+        if self.action == "posts":
+            return PostListSerializer
+
         return HashtagListSerializer
 
+    def get_posts(self, post_ids: list[int]) -> list[Post]:
+        """
+        Load posts with the relations post lists render, in the order
+        of post_ids. Like and comment counts are stored on the posts.
+        """
+        posts = (
+            Post.objects.filter(id__in=post_ids)
+            .select_related("author")
+            .prefetch_related("hashtags", "images__renditions")
+        )
+        return order_by_ids(posts, post_ids)
+
     @extend_schema(
         parameters=[
             OpenApiParameter("id", OpenApiTypes.INT, OpenApiParameter.PATH)
         ]
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(self, request, *args, **kwargs)
+        instance = self.get_object()
+
+        # Only the first page of posts is embedded into the hashtag,
+        # the rest is available via the posts endpoint.
+        paginator = HashtagPostPagination()
+        links = paginator.paginate_first_page(
+            get_published_hashtag_links(instance),
+            request,
+            url=request.build_absolute_uri(
+                reverse("feed:hashtag-posts", kwargs={"pk": instance.id})
+            ),
+        )
+        instance.first_page_posts = self.get_posts(
+            [link.post_id for link in links]
+        )
+        instance.posts_next_url = paginator.get_next_link()
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    @action(methods=["GET"], detail=True, url_path="posts")
+    def posts(self, request, pk=None):
+        """Endpoint for getting a list of published posts with the hashtag."""
+        hashtag = self.get_object()
+
+        paginator = HashtagPostPagination()
+        links = paginator.paginate_queryset(
+            get_published_hashtag_links(hashtag), request, view=self
+        )
+        posts = self.get_posts([link.post_id for link in links])
+        serializer = self.get_serializer(posts, many=True)
+
+        return paginator.get_paginated_response(serializer.data)
 
 
 class PostViewSet(
@@ -101,25 +156,18 @@ class PostViewSet(
     """Endpoint for creating, updating, retrieving and deleting posts."""
 
     permission_classes = (IsPostAuthorOrIfAuthenticatedReadOnly,)
-    pagination_class = Pagination
+    pagination_class = PostPagination
 
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        transaction.on_commit(lambda: push_post_to_timelines.delay(post.id))
 
     def get_queryset(self):
         queryset = Post.objects.filter(is_published=True)
 
         if self.action == "retrieve":
-            user = self.request.user
-
-            queryset = queryset.annotate(
-                num_likes=Count("likes", distinct=True),
-                has_like_from_user=Exists(
-                    Like.objects.filter(user=user, post=OuterRef("pk"))
-                ),
-            )
             queryset = queryset.select_related("author").prefetch_related(
-                "hashtags", "comments__author", "images"
+                "hashtags", "comments__author", "images__renditions"
             )
 
         return queryset
@@ -139,19 +187,6 @@ class PostViewSet(
 
         return PostSerializer
 
-    def get_annotated_posts_list(self) -> QuerySet[Post]:
-        """Annotates queryset for endpoints with post list."""
-        posts = Post.objects.annotate(
-            num_likes=Count("likes", distinct=True),
-            has_like_from_user=Exists(
-                Like.objects.filter(
-                    user=self.request.user, post=OuterRef("pk")
-                )
-            ),
-            num_comments=Count("comments", distinct=True),
-        )
-        return posts
-
     @action(
         detail=True,
         url_path="like_toggle",
@@ -161,15 +196,7 @@ class PostViewSet(
         """Endpoint for adding and removing likes to specific posts."""
 
         post = self.get_object()
-        user = request.user
-
-        has_like_from_user = Like.objects.filter(user=user, post=post).exists()
-
-        if has_like_from_user:
-            like = Like.objects.get(user=user, post=post)
-            like.delete()
-        else:
-            Like.objects.create(user=user, post=post)
+        toggle_like(request.user.id, post.id)
 
         return HttpResponseRedirect(
             request.META.get("HTTP_REFERER", post.get_absolute_url())
@@ -189,7 +216,10 @@ class PostViewSet(
         serializer = self.get_serializer(data=request.data)
 
         serializer.is_valid(raise_exception=True)
-        serializer.save(author=author, post=post)
+
+        with transaction.atomic():
+            serializer.save(author=author, post=post)
+            change_comment_count(post.id, 1)
 
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -204,15 +234,20 @@ class PostViewSet(
 
         user = request.user
 
-        posts = self.get_annotated_posts_list()
         posts = (
-            posts.filter(likes__user=user)
+            Post.objects.filter(likes__user=user)
             .select_related("author")
-            .prefetch_related("hashtags", "likes", "comments", "images")
+            .prefetch_related("hashtags", "images__renditions")
+        )
+        page = self.paginate_queryset(posts)
+        serializer = self.get_serializer(page, many=True)
+
+        # Every post of the page is known to be liked by the user
+        get_viewer_state(serializer.context).mark_liked(
+            post.id for post in page
         )
-        serializer = self.get_serializer(posts, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=["GET"],
@@ -228,15 +263,22 @@ class PostViewSet(
 
         user = self.request.user
 
-        posts = self.get_annotated_posts_list()
+        paginator = TimelinePagination()
+        entries = paginator.paginate(
+            lambda position, limit: timeline.read(user, position, limit),
+            request,
+        )
+        post_ids = [entry.post_id for entry in entries]
+
         posts = (
-            posts.filter(author__followers__follower=user)
+            Post.objects.filter(id__in=post_ids)
             .select_related("author")
-            .prefetch_related("hashtags", "likes", "comments", "images")
+            .prefetch_related("hashtags", "images__renditions")
         )
+        posts = order_by_ids(posts, post_ids)
         serializer = self.get_serializer(posts, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(
         methods=["GET"],
@@ -249,11 +291,14 @@ class PostViewSet(
         Endpoint for getting the list of users who liked the specific post.
         """
 
-        users_who_liked = get_user_model().objects.filter(likes__post_id=pk)
-
+        paginator = LikePagination()
+        likes = paginator.paginate_queryset(
+            Like.objects.filter(post_id=pk).select_related("user"), request
+        )
+        users_who_liked = [like.user for like in likes]
         serializer = self.get_serializer(users_who_liked, many=True)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
     @extend_schema(
         parameters=[
@@ -275,7 +320,7 @@ class ImageDeleteView(generics.DestroyAPIView):
     permission_classes = (IsAuthenticated, IsPostAuthorUser)
 
 
-class PostImageUploadView(generics.CreateAPIView):
+class PostImageUploadView(ImageUploadMixin, generics.CreateAPIView):
     """Endpoint for removing an image from post."""
 
     queryset = PostImage.objects.all()
@@ -283,14 +328,17 @@ class PostImageUploadView(generics.CreateAPIView):
     permission_classes = (IsPostAuthorUser,)
 
     def perform_create(self, serializer):
-        post = Post.objects.get(id=self.kwargs.get("pk"))
-        serializer.save(post=post)
+        image = serializer.save(post=self.target_post)
+        transaction.on_commit(
+            lambda: generate_post_image_renditions.delay(image.id)
+        )
 
     def post(self, request, *args, **kwargs):
         post = Post.objects.get(id=self.kwargs.get("pk"))
 
         if request.user and request.user.is_authenticated:
             if post.author == request.user:
+                self.target_post = post
                 self.create(request, *args, **kwargs)
                 return HttpResponseRedirect(
                     request.META.get("HTTP_REFERER", post.get_absolute_url())
@@ -301,6 +349,87 @@ class PostImageUploadView(generics.CreateAPIView):
         return Response(status=status.HTTP_401_UNAUTHORIZED)
 
 
+class PostImageBatchUploadView(ImageUploadMixin, generics.GenericAPIView):
+    """Endpoint for uploading several images to post at once."""
+
+    queryset = Post.objects.all()
+    serializer_class = PostImageBatchUploadSerializer
+    permission_classes = (IsAuthenticated, IsPostAuthorUser)
+    upload_max_files = settings.POST_IMAGE_BATCH_MAX_FILES
+
+    @extend_schema(responses={201: PostImageListSerializer(many=True)})
+    def post(self, request, *args, **kwargs):
+        # Ownership is checked before the uploaded files are parsed
+        post = self.get_object()
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        images = serializer.save(post=post)
+
+        image_ids = [image.id for image in images]
+        transaction.on_commit(lambda: renditions.queue_renditions(image_ids))
+
+        prefetch_related_objects(images, "renditions")
+        serializer = PostImageListSerializer(
+            images, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class PostImagePresignView(generics.GenericAPIView):
+    """
+    Endpoint issuing a form for uploading an image of post straight
+    to the storage bucket. The upload is then reported to the upload
+    completion endpoint with the returned token.
+    """
+
+    queryset = Post.objects.all()
+    serializer_class = PostImagePresignSerializer
+    permission_classes = (IsAuthenticated, IsPostAuthorUser)
+
+    def post(self, request, *args, **kwargs):
+        if not direct_uploads.is_enabled():
+            raise NotFound("Direct uploads are not enabled.")
+
+        post = self.get_object()
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = direct_uploads.create_upload(
+            post, serializer.validated_data["content_type"]
+        )
+
+        return Response(
+            self.get_serializer(upload).data, status=status.HTTP_201_CREATED
+        )
+
+
+class PostImageUploadCompleteView(generics.GenericAPIView):
+    """Endpoint adding an image uploaded straight to the bucket to post."""
+
+    queryset = Post.objects.all()
+    serializer_class = PostImageUploadCompleteSerializer
+    permission_classes = (IsAuthenticated, IsPostAuthorUser)
+
+    @extend_schema(responses={201: PostImageListSerializer})
+    def post(self, request, *args, **kwargs):
+        if not direct_uploads.is_enabled():
+            raise NotFound("Direct uploads are not enabled.")
+
+        post = self.get_object()
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        image = direct_uploads.complete_upload(
+            post, serializer.validated_data["token"]
+        )
+
+        serializer = PostImageListSerializer(
+            image, context=self.get_serializer_context()
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
 @extend_schema(
     parameters=[
         OpenApiParameter("id", OpenApiTypes.INT, OpenApiParameter.PATH)
@@ -310,15 +439,11 @@ class PostponedPostViewSet(viewsets.ModelViewSet):
     """Endpoint for creating, updating, retrieving and deleting postponed posts."""
 
     permission_classes = (IsAuthenticated, IsPostAuthorUser)
-    pagination_class = Pagination
+    pagination_class = PostponedPostPagination
 
     def perform_create(self, serializer):
-        post = serializer.save(author=self.request.user)
-        publish_postponed_post.apply_async((post.id,), eta=post.published_at)
-
-    def perform_update(self, serializer):
-        post = self.get_object()
-        publish_postponed_post.apply_async((post.id,), eta=post.published_at)
+        # Due posts are published by the publish_due_posts beat job
+        serializer.save(author=self.request.user)
 
     def get_queryset(self):
         queryset = Post.objects.filter(
@@ -326,7 +451,9 @@ class PostponedPostViewSet(viewsets.ModelViewSet):
         ).order_by("published_at")
 
         if self.action == "list":
-            queryset = queryset.prefetch_related("hashtags", "images")
+            queryset = queryset.prefetch_related(
+                "hashtags", "images__renditions"
+            )
 
         return queryset
 
@@ -0,0 +1,178 @@
+import threading
+import uuid
+from functools import cache
+
+import redis
+from django.conf import settings
+from redis.exceptions import LockNotOwnedError, ResponseError
+
+
+class InMemoryRedis:
+    """
+    In-process stand-in for the subset of Redis commands used by the
+    project. It is used when REDIS_URL is not configured, e.g. in tests.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def flushdb(self) -> bool:
+        with self._lock:
+            self._data.clear()
+        return True
+
+    def exists(self, *keys) -> int:
+        with self._lock:
+            return sum(key in self._data for key in keys)
+
+    def delete(self, *keys) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    def expire(self, name: str, time: int) -> bool:
+        # Keys never expire in memory, only the reply is emulated
+        with self._lock:
+            return name in self._data
+
+    def rename(self, src: str, dst: str) -> bool:
+        with self._lock:
+            if src not in self._data:
+                raise ResponseError("no such key")
+            self._data[dst] = self._data.pop(src)
+        return True
+
+    def get(self, name: str) -> str | None:
+        with self._lock:
+            return self._data.get(name)
+
+    def lock(
+        self, name: str, timeout=None, blocking: bool = True
+    ) -> "InMemoryLock":
+        return InMemoryLock(self, name)
+
+    def hget(self, name: str, key: str) -> str | None:
+        with self._lock:
+            return self._data.get(name, {}).get(key)
+
+    def hset(
+        self, name: str, key: str = None, value=None, mapping: dict = None
+    ) -> int:
+        items = dict(mapping or {})
+        if key is not None:
+            items[key] = value
+
+        with self._lock:
+            hash_ = self._data.setdefault(name, {})
+            num_new = sum(key not in hash_ for key in items)
+            hash_.update((key, str(value)) for key, value in items.items())
+        return num_new
+
+    def hdel(self, name: str, *keys) -> int:
+        with self._lock:
+            hash_ = self._data.get(name, {})
+            num_deleted = sum(hash_.pop(key, None) is not None for key in keys)
+            if not hash_:
+                self._data.pop(name, None)
+            return num_deleted
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        with self._lock:
+            hash_ = self._data.setdefault(name, {})
+            value = int(hash_.get(key, 0)) + amount
+            hash_[key] = str(value)
+        return value
+
+    def hgetall(self, name: str) -> dict[str, str]:
+        with self._lock:
+            return dict(self._data.get(name, {}))
+
+    def sadd(self, name: str, *values) -> int:
+        with self._lock:
+            set_ = self._data.setdefault(name, set())
+            size = len(set_)
+            set_.update(str(value) for value in values)
+            return len(set_) - size
+
+    def srem(self, name: str, *values) -> int:
+        with self._lock:
+            set_ = self._data.get(name, set())
+            size = len(set_)
+            set_.difference_update(str(value) for value in values)
+            if not set_:
+                self._data.pop(name, None)
+            return size - len(set_)
+
+    def sismember(self, name: str, value) -> bool:
+        with self._lock:
+            return str(value) in self._data.get(name, set())
+
+    def smismember(self, name: str, values) -> list[int]:
+        with self._lock:
+            set_ = self._data.get(name, set())
+            return [int(str(value) in set_) for value in values]
+
+    def smembers(self, name: str) -> set[str]:
+        with self._lock:
+            return set(self._data.get(name, set()))
+
+    def scard(self, name: str) -> int:
+        with self._lock:
+            return len(self._data.get(name, set()))
+
+    def sinter(self, *names) -> set[str]:
+        with self._lock:
+            sets = [self._data.get(name, set()) for name in names]
+            return set.intersection(*sets) if sets else set()
+
+    # Defined last, so the name does not shadow the builtin in the
+    # annotations of the other methods
+    def set(self, name: str, value, nx: bool = False, ex=None) -> bool | None:
+        # Keys never expire in memory, `ex` is accepted for compatibility
+        with self._lock:
+            if nx and name in self._data:
+                return None
+            self._data[name] = str(value)
+        return True
+
+
+class InMemoryLock:
+    """
+    Stand-in for the Lock of redis-py: it is only released or renewed by
+    the holder of its token. Locks never expire in memory, and acquiring
+    never blocks.
+    """
+
+    def __init__(self, redis: InMemoryRedis, name: str):
+        self.redis = redis
+        self.name = name
+        self.token = uuid.uuid4().hex
+
+    def acquire(self) -> bool:
+        return bool(self.redis.set(self.name, self.token, nx=True))
+
+    def reacquire(self) -> bool:
+        if self.redis.get(self.name) != self.token:
+            raise LockNotOwnedError("Cannot reacquire a lock not owned")
+        return True
+
+    def release(self) -> None:
+        with self.redis._lock:
+            if self.redis._data.get(self.name) != self.token:
+                raise LockNotOwnedError("Cannot release a lock not owned")
+            del self.redis._data[self.name]
+
+
+_local_redis = InMemoryRedis()
+
+
+@cache
+def _connect(url: str) -> redis.Redis:
+    return redis.Redis.from_url(url, decode_responses=True)
+
+
+def get_redis() -> redis.Redis | InMemoryRedis:
+    if settings.REDIS_URL:
+        return _connect(settings.REDIS_URL)
+
+    return _local_redis
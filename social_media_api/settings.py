@@ -11,7 +11,9 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+from datetime import timedelta
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 from pathlib import Path
 
@@ -102,6 +104,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+REDIS_URL = os.environ.get("REDIS_URL")
+
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -140,6 +156,55 @@ CELERY_TIMEZONE = "Europe/Berlin"
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
 
+# Images are decoded by a dedicated pool of worker processes
+CELERY_TASK_ROUTES = {
+    "feed.tasks.generate_post_image_renditions": {"queue": "images"},
+}
+
+CELERY_BEAT_SCHEDULE = {
+    "delete-orphan-hashtags": {
+        "task": "feed.tasks.delete_orphan_hashtags",
+        "schedule": crontab(minute="*/15"),
+    },
+    "verify-follow-counters": {
+        "task": "user.tasks.verify_follow_counters",
+        "schedule": crontab(minute=0, hour=4),
+    },
+    "delete-unreferenced-blobs": {
+        "task": "feed.tasks.delete_unreferenced_blobs",
+        "schedule": crontab(minute=30),
+    },
+    "publish-due-posts": {
+        "task": "feed.tasks.publish_due_posts",
+        "schedule": timedelta(seconds=10),
+    },
+    "flush-like-buffer": {
+        "task": "feed.tasks.flush_like_buffer",
+        "schedule": timedelta(seconds=5),
+    },
+}
+
+# Materialized home timelines.
+# Posts of authors having at least TIMELINE_FANOUT_FOLLOWER_THRESHOLD
+# followers are not pushed to timelines but pulled at read time.
+TIMELINE_FANOUT_FOLLOWER_THRESHOLD = int(
+    os.environ.get("TIMELINE_FANOUT_FOLLOWER_THRESHOLD", 10_000)
+)
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_SIZE = 200
+
+# When enabled, like toggles are buffered in Redis and persisted
+# in batches by the flush_like_buffer task. The in-process fallback is
+# not shared with the workers flushing the buffer, so it requires Redis.
+LIKE_WRITE_BEHIND = os.environ.get("LIKE_WRITE_BEHIND") == "True" and bool(
+    REDIS_URL
+)
+
+# Follower and following id sets of users are cached in Redis sets.
+# The in-process fallback is not shared between processes, so the
+# cache is only enabled together with Redis.
+SOCIAL_GRAPH_CACHE = bool(REDIS_URL)
+
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/5.0/howto/static-files/
@@ -149,6 +214,49 @@ STATIC_URL = "static/"
 MEDIA_ROOT = "/vol/web/media"
 MEDIA_URL = "/media/"
 
+# Header handing the delivery of media files to the front proxy:
+# "X-Accel-Redirect" for nginx, "X-Sendfile" for Apache or lighttpd.
+# Files are streamed by the app server when it is not set. Either way
+# the app checks access first, images of postponed posts are only
+# served to their author.
+MEDIA_SENDFILE_HEADER = os.environ.get("MEDIA_SENDFILE_HEADER")
+# Internal nginx location aliasing MEDIA_ROOT, used by X-Accel-Redirect,
+# see nginx/default.conf
+MEDIA_ACCEL_REDIRECT_PREFIX = (
+    os.environ.get("MEDIA_ACCEL_REDIRECT_PREFIX") or "/protected-media/"
+)
+
+# Optional S3-compatible bucket (AWS S3, MinIO) storing uploaded images
+# instead of MEDIA_ROOT. It requires boto3, and lets clients upload post
+# images to the bucket directly with presigned forms. Objects left under
+# the "incoming/" prefix by unfinished uploads should be expired with a
+# lifecycle rule of the bucket.
+S3_BUCKET = os.environ.get("S3_BUCKET")
+S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL")
+S3_REGION = os.environ.get("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.environ.get("S3_SECRET_ACCESS_KEY")
+# Public URL of the bucket; files are served with presigned URLs without it
+S3_MEDIA_URL = os.environ.get("S3_MEDIA_URL")
+S3_URL_EXPIRES = 60 * 60
+
+# Seconds a presigned upload form stays valid
+DIRECT_UPLOAD_EXPIRES = 15 * 60
+
+# Limits of uploaded images, checked while the upload is received
+IMAGE_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+
+# Number of images accepted by a single batch upload to a post
+POST_IMAGE_BATCH_MAX_FILES = 10
+
+# Bounding boxes of the renditions generated for every post image
+POST_IMAGE_RENDITION_SIZES = {
+    "thumbnail": (320, 320),
+    "feed": (1080, 1350),
+    "full": (2048, 2048),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -0,0 +1,318 @@
+import base64
+import hashlib
+import mimetypes
+import os
+import tempfile
+from functools import cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, Storage
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:  # boto3 is only required by S3BlobStorage
+    boto3 = None
+
+
+def get_content_hash(content: File) -> str:
+    """
+    SHA-256 of the file content. Upload handlers may compute it while
+    the upload is received and attach it as `content_hash`.
+    """
+    content_hash = getattr(content, "content_hash", None)
+    if content_hash:
+        return content_hash
+
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def get_blob_name(name: str, content_hash: str) -> str:
+    """
+    Name of the blob with the given content. The directory and extension
+    of the requested name are kept, the rest of it is replaced with the
+    hash.
+    """
+    directory, filename = os.path.split(name)
+    _, extension = os.path.splitext(filename)
+
+    return os.path.join(
+        directory,
+        content_hash[:2],
+        content_hash[2:4],
+        f"{content_hash}{extension.lower()}",
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Stores files under the hash of their content, so identical uploads
+    share a single file, see get_blob_name.
+
+    Files are shared, so they are never deleted by the fields using
+    them, see feed.blobs for their reference counting.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = get_blob_name(name, get_content_hash(content))
+
+        if self.exists(name):
+            # A fresh modification time protects the reused file
+            # from the deletion of unreferenced blobs.
+            os.utime(self.path(name))
+            return name
+
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # The same name means the same content, so it is reused as is
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+
+        # Written aside and moved into place atomically, so concurrent
+        # uploads of the same content never see a partial file. Hidden
+        # temporary files are never served, see serve_media.
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+
+            # Temporary files are created private, unlike regular uploads
+            os.chmod(temp_path, self.file_permissions_mode or 0o644)
+
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        return name
+
+
+class UploadModified(Exception):
+    """The uploaded object was overwritten after it had been checked."""
+
+
+class S3BlobStorage(Storage):
+    """
+    Content-addressed storage in an S3-compatible bucket, e.g. MinIO,
+    naming files like ContentAddressedStorage does.
+
+    Clients may upload files to the bucket directly: presign_upload
+    issues the upload form and import_upload moves the uploaded object
+    to its content-addressed name without downloading it.
+    """
+
+    def __init__(self):
+        if boto3 is None:
+            raise ImproperlyConfigured(
+                "S3_BUCKET is set, but boto3 is not installed."
+            )
+
+        self.bucket = settings.S3_BUCKET
+        self.media_url = settings.S3_MEDIA_URL
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID,
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+        )
+
+    def head(self, name: str) -> dict | None:
+        """Metadata of the object, or None if it does not exist."""
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=name)
+        except ClientError as error:
+            if error.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return None
+            raise
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+
+        name = get_blob_name(name, get_content_hash(content))
+
+        if self.exists(name):
+            self.touch(name)
+            return name
+
+        content.seek(0)
+        self.client.upload_fileobj(
+            content,
+            self.bucket,
+            name,
+            ExtraArgs={"ContentType": self.get_content_type(name)},
+        )
+
+        return name
+
+    def touch(self, name: str) -> None:
+        """
+        Refresh the modification time of a reused object, protecting it
+        from the deletion of unreferenced blobs.
+        """
+        self.client.copy_object(
+            Bucket=self.bucket,
+            Key=name,
+            CopySource={"Bucket": self.bucket, "Key": name},
+            ContentType=self.get_content_type(name),
+            MetadataDirective="REPLACE",
+        )
+
+    def _open(self, name, mode="rb"):
+        file = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE
+        )
+        self.client.download_fileobj(self.bucket, name, file)
+        file.seek(0)
+
+        return File(file, name)
+
+    def exists(self, name):
+        return self.head(name) is not None
+
+    def delete(self, name):
+        self.client.delete_object(Bucket=self.bucket, Key=name)
+
+    def size(self, name):
+        return self.head(name)["ContentLength"]
+
+    def get_modified_time(self, name):
+        return self.head(name)["LastModified"]
+
+    def url(self, name):
+        if self.media_url:
+            return f"{self.media_url.rstrip('/')}/{name}"
+
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": name},
+            ExpiresIn=settings.S3_URL_EXPIRES,
+        )
+
+    @staticmethod
+    def get_content_type(name: str) -> str:
+        content_type, _ = mimetypes.guess_type(name)
+        return content_type or "application/octet-stream"
+
+    def presign_upload(
+        self, key: str, content_type: str, max_size: int, expires: int
+    ) -> dict:
+        """
+        Presigned POST form uploading a file of up to max_size bytes to
+        the key. Returns the form "url" and its "fields".
+        """
+        return self.client.generate_presigned_post(
+            self.bucket,
+            key,
+            Fields={"Content-Type": content_type},
+            Conditions=[
+                {"Content-Type": content_type},
+                ["content-length-range", 1, max_size],
+            ],
+            ExpiresIn=expires,
+        )
+
+    def read_range(self, key: str, length: int) -> tuple[bytes, int, str]:
+        """
+        The first `length` bytes of the object, its size and ETag, which
+        pins later copies to the version that was read.
+        """
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=key, Range=f"bytes=0-{length - 1}"
+        )
+        content_range = response.get("ContentRange")
+        size = (
+            int(content_range.rsplit("/", 1)[1])
+            if content_range
+            else response["ContentLength"]
+        )
+
+        return response["Body"].read(), size, response["ETag"]
+
+    def import_upload(self, key: str, name: str, etag: str) -> str:
+        """
+        Move an object uploaded to the key to the content-addressed name
+        built from `name`, and return that name. The SHA-256 of the
+        content is computed by the bucket while copying the object.
+
+        The object is only copied while it still has the given ETag,
+        i.e. it was not overwritten after being checked, otherwise
+        UploadModified is raised. The ETags of the copies are compared
+        as well, for servers ignoring the copy conditions.
+        """
+        source = {"Bucket": self.bucket, "Key": key}
+
+        try:
+            response = self.client.copy_object(
+                Bucket=self.bucket,
+                Key=key,
+                CopySource=source,
+                CopySourceIfMatch=etag,
+                MetadataDirective="REPLACE",
+                ChecksumAlgorithm="SHA256",
+            )
+            result = response["CopyObjectResult"]
+            if result["ETag"] != etag:
+                raise UploadModified(key)
+
+            name = get_blob_name(
+                name, base64.b64decode(result["ChecksumSHA256"]).hex()
+            )
+
+            if self.exists(name):
+                self.touch(name)
+            else:
+                response = self.client.copy_object(
+                    Bucket=self.bucket,
+                    Key=name,
+                    CopySource=source,
+                    CopySourceIfMatch=etag,
+                    ContentType=self.get_content_type(name),
+                    MetadataDirective="REPLACE",
+                )
+                if response["CopyObjectResult"]["ETag"] != etag:
+                    self.delete(name)
+                    raise UploadModified(key)
+        except ClientError as error:
+            if error.response["Error"]["Code"] in (
+                "412",
+                "PreconditionFailed",
+            ):
+                raise UploadModified(key) from error
+            raise
+
+        self.delete(key)
+
+        return name
+
+
+@cache
+def get_blob_storage() -> Storage:
+    """The S3 storage if S3_BUCKET is configured, local files otherwise."""
+    if settings.S3_BUCKET:
+        return S3BlobStorage()
+
+    return ContentAddressedStorage()
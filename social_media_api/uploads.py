@@ -0,0 +1,166 @@
+import hashlib
+import io
+import os
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+# Leading bytes of the accepted image formats and their extensions.
+# WebP files start with a RIFF header, "WEBP" follows the chunk size.
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+SIGNATURE_LENGTH = 12
+
+# Image dimensions must be found within this many leading bytes
+HEADER_MAX_LENGTH = 1024 * 1024
+
+# Room for the boundaries, part headers and form fields of a request
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Uploaded file is too large."
+    default_code = "upload_too_large"
+
+
+def sniff_image_extension(header: bytes) -> str | None:
+    """File extension of the image format recognized by its magic bytes."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+
+    for signature, extension in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return extension
+
+    return None
+
+
+def read_image_size(header: bytes) -> tuple[int, int] | None:
+    """
+    Dimensions of the image, if the received part of it already holds
+    them. Only the header is parsed, no pixel data is decoded.
+    """
+    try:
+        with Image.open(io.BytesIO(header)) as image:
+            return image.size
+    except Image.DecompressionBombError:
+        raise
+    except Exception:
+        # A truncated header fails in many ways, more data is awaited
+        return None
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams uploaded images to temporary files, checking them while the
+    data arrives, so a bad upload is rejected before the rest of the
+    request body is read:
+
+    * requests and files over IMAGE_UPLOAD_MAX_SIZE raise UploadTooLarge,
+    * files whose magic bytes are not an image, or whose header declares
+      more than IMAGE_UPLOAD_MAX_PIXELS pixels, raise ValidationError.
+
+    The file gets the extension of its sniffed format, and the SHA-256
+    of its content as `content_hash` for the blob storage.
+    """
+
+    def __init__(self, request=None, max_files: int = 1):
+        super().__init__(request)
+        self.max_files = max_files
+        self.max_size = settings.IMAGE_UPLOAD_MAX_SIZE
+        self.max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        max_length = self.max_files * self.max_size + MULTIPART_OVERHEAD
+
+        if content_length > max_length:
+            raise UploadTooLarge()
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.digest = hashlib.sha256()
+        self.header = b""
+        self.extension = None
+        self.size_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.reject(UploadTooLarge())
+
+        if not self.size_checked:
+            self.inspect_header(raw_data)
+
+        self.digest.update(raw_data)
+        super().receive_data_chunk(raw_data, start)
+
+    def inspect_header(self, raw_data: bytes) -> None:
+        self.header += raw_data
+
+        if self.extension is None and len(self.header) >= SIGNATURE_LENGTH:
+            self.extension = sniff_image_extension(self.header)
+
+            if self.extension is None:
+                self.reject_invalid("Upload a valid image.")
+
+        if self.extension is None:
+            return
+
+        try:
+            size = read_image_size(self.header)
+        except Image.DecompressionBombError:
+            self.reject_invalid("Image has too many pixels.")
+
+        if size is None:
+            if len(self.header) > HEADER_MAX_LENGTH:
+                self.reject_invalid("Upload a valid image.")
+        else:
+            width, height = size
+            if width * height > self.max_pixels:
+                self.reject_invalid("Image has too many pixels.")
+
+            self.size_checked = True
+            self.header = b""
+
+    def file_complete(self, file_size):
+        if self.extension is None or not self.size_checked:
+            # The file ended before its format or dimensions were known
+            self.reject_invalid("Upload a valid image.")
+
+        file = super().file_complete(file_size)
+
+        name, _ = os.path.splitext(file.name)
+        file.name = f"{name}.{self.extension}"
+        file.content_hash = self.digest.hexdigest()
+
+        return file
+
+    def reject_invalid(self, message: str) -> None:
+        self.reject(ValidationError({self.field_name: [message]}))
+
+    def reject(self, exc: APIException) -> None:
+        # Django only cleans up after StopUpload, other errors abort the
+        # parsing with the temporary file left open.
+        self.upload_interrupted()
+        raise exc
+
+
+class ImageUploadMixin:
+    """Parse the multipart uploads of the view with ImageUploadHandler."""
+
+    upload_max_files = 1
+
+    def initialize_request(self, request, *args, **kwargs):
+        request.upload_handlers = [
+            ImageUploadHandler(request, max_files=self.upload_max_files)
+        ]
+        return super().initialize_request(request, *args, **kwargs)
@@ -15,17 +15,18 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
+import re
+
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from drf_spectacular.views import (
     SpectacularAPIView,
     SpectacularSwaggerView,
     SpectacularRedocView,
 )
 
-from social_media_api.views import ApiRootView
+from social_media_api.views import ApiRootView, serve_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -44,4 +45,9 @@ urlpatterns = [
         name="redoc",
     ),
     path("", ApiRootView.as_view(), name="root"),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+    re_path(
+        rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$",
+        serve_media,
+        name="media",
+    ),
+]
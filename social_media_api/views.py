@@ -1,10 +1,31 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    HttpResponseNotModified,
+)
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_etags
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
 from drf_spectacular.utils import extend_schema, inline_serializer
 from rest_framework import serializers
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.generics import GenericAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 
+from feed.media import PRIVATE, get_file_visibility
+
 
 class ApiRootView(GenericAPIView):
     permission_classes = (IsAuthenticated,)
@@ -82,3 +103,109 @@ class ApiRootView(GenericAPIView):
                 },
             }
         )
+
+
+# Names of ContentAddressedStorage files, "<dir>/ab/cd/abcd...<ext>"
+CONTENT_ADDRESSED_NAME = re.compile(
+    r"(?:^|/)([0-9a-f]{2})/([0-9a-f]{2})/(\1\2[0-9a-f]{60})\.\w+$"
+)
+
+# The content behind a content-addressed name never changes
+IMMUTABLE_CACHE_CONTROL = "max-age=31536000, immutable"
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve an uploaded file from MEDIA_ROOT.
+
+    Files are only served to users allowed to see them, e.g. images of
+    postponed posts to their author only. The delivery is then handed
+    to the front proxy with MEDIA_SENDFILE_HEADER if it is set.
+    Otherwise the file is streamed with FileResponse, which WSGI
+    servers supporting wsgi.file_wrapper send with sendfile.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+
+    # Hidden files are temporary files of uploads still being written
+    if any(part.startswith(".") for part in path.split("/")):
+        raise Http404
+
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    visibility = get_file_visibility(path, get_media_user(request))
+
+    if visibility is None:
+        raise Http404
+
+    match = CONTENT_ADDRESSED_NAME.search(path)
+    modified_time = os.stat(full_path).st_mtime
+
+    # Private files must not be kept by shared caches
+    cache_scope = "private" if visibility == PRIVATE else "public"
+
+    if match:
+        headers = {
+            "ETag": f'"{match[3]}"',
+            "Cache-Control": f"{cache_scope}, {IMMUTABLE_CACHE_CONTROL}",
+        }
+        if_none_match = request.headers.get("If-None-Match", "")
+        not_modified = headers["ETag"] in parse_etags(if_none_match)
+    else:
+        headers = {
+            "Last-Modified": http_date(modified_time),
+            "Cache-Control": f"{cache_scope}, no-cache",
+        }
+        not_modified = not was_modified_since(
+            request.headers.get("If-Modified-Since"), modified_time
+        )
+
+    if not_modified:
+        response = HttpResponseNotModified()
+    else:
+        response = get_media_response(path, full_path)
+
+    for header, value in headers.items():
+        response[header] = value
+
+    return response
+
+
+def get_media_user(request):
+    """
+    The user requesting a media file, authenticated by the session or by
+    the API token. Invalid tokens are treated as anonymous requests.
+    """
+    if request.user.is_authenticated:
+        return request.user
+
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return request.user
+
+    return authenticated[0] if authenticated else request.user
+
+
+def get_media_response(path: str, full_path: str) -> HttpResponse:
+    header = settings.MEDIA_SENDFILE_HEADER
+
+    if not header:
+        return FileResponse(open(full_path, "rb"))
+
+    content_type, _ = mimetypes.guess_type(full_path)
+    response = HttpResponse(
+        content_type=content_type or "application/octet-stream"
+    )
+
+    if header == "X-Accel-Redirect":
+        prefix = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip("/")
+        response[header] = f"{prefix}/{quote(path)}"
+    else:
+        response[header] = full_path
+
+    return response
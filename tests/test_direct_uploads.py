@@ -0,0 +1,192 @@
+import hashlib
+import io
+from unittest import skipUnless
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from feed.models import Blob, PostImage, PostImageRendition
+from social_media_api.storage import UploadModified, boto3, get_blob_storage
+from tests.test_post_api import sample_post
+from tests.test_user_info_api import sample_user
+
+try:
+    from moto import mock_aws
+except ImportError:
+    mock_aws = None
+
+
+def presign_url(post_id: int) -> str:
+    return reverse("feed:post-image-presign", args=[post_id])
+
+
+def complete_url(post_id: int) -> str:
+    return reverse("feed:post-image-upload-complete", args=[post_id])
+
+
+class DirectUploadsDisabledApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_presign_is_not_found_without_bucket(self):
+        post = sample_post(self.user)
+
+        res = self.client.post(
+            presign_url(post.id), {"content_type": "image/png"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@skipUnless(boto3 and mock_aws, "Requires boto3 and moto")
+@override_settings(
+    S3_BUCKET="media",
+    S3_ENDPOINT_URL=None,
+    S3_MEDIA_URL="https://media.example.com/",
+    S3_ACCESS_KEY_ID="testing",
+    S3_SECRET_ACCESS_KEY="testing",
+)
+class DirectUploadsApiTests(TestCase):
+    def setUp(self):
+        self.mock = mock_aws()
+        self.mock.start()
+
+        get_blob_storage.cache_clear()
+        self.storage = get_blob_storage()
+        self.storage.client.create_bucket(Bucket="media")
+
+        # Storages of file fields are chosen once, when models are loaded
+        self.fields = [
+            PostImage._meta.get_field("image"),
+            PostImageRendition._meta.get_field("file"),
+        ]
+        self.field_storages = [field.storage for field in self.fields]
+        for field in self.fields:
+            field.storage = self.storage
+
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        for field, storage in zip(self.fields, self.field_storages):
+            field.storage = storage
+
+        get_blob_storage.cache_clear()
+        self.mock.stop()
+
+    def upload(self, post, content: bytes, content_type: str) -> str:
+        res = self.client.post(
+            presign_url(post.id), {"content_type": content_type}
+        )
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        # The client posts the form to the bucket, emulated with a put
+        key = res.data["form_fields"]["key"]
+        self.storage.client.put_object(Bucket="media", Key=key, Body=content)
+
+        return res.data["token"]
+
+    def test_direct_upload(self):
+        post = sample_post(self.user)
+        content = io.BytesIO()
+        Image.new("RGB", (40, 20), color="red").save(content, "PNG")
+        token = self.upload(post, content.getvalue(), "image/png")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(complete_url(post.id), {"token": token})
+
+        image = post.images.get()
+        content_hash = hashlib.sha256(content.getvalue()).hexdigest()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(image.image.name.endswith(f"{content_hash}.png"))
+        self.assertTrue(self.storage.exists(image.image.name))
+        self.assertEqual(Blob.objects.get(name=image.image.name).ref_count, 1)
+        self.assertEqual(image.renditions.count(), 3)
+        self.assertEqual(
+            image.image.url,
+            f"https://media.example.com/{image.image.name}",
+        )
+
+        incoming = self.storage.client.list_objects_v2(
+            Bucket="media", Prefix="incoming/"
+        )
+        self.assertEqual(incoming["KeyCount"], 0)
+
+    def test_direct_upload_of_non_image_is_rejected(self):
+        post = sample_post(self.user)
+        token = self.upload(post, b"#!/bin/sh\necho hello\n", "image/png")
+
+        res = self.client.post(complete_url(post.id), {"token": token})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(post.images.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_oversized_direct_upload_is_rejected(self):
+        post = sample_post(self.user)
+        content = io.BytesIO()
+        Image.effect_noise((40, 40), 64).save(content, "PNG")
+        token = self.upload(post, content.getvalue(), "image/png")
+
+        res = self.client.post(complete_url(post.id), {"token": token})
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertFalse(post.images.exists())
+
+    def test_upload_overwritten_after_check_is_not_imported(self):
+        key = "incoming/1/upload"
+        content = io.BytesIO()
+        Image.new("RGB", (40, 20)).save(content, "PNG")
+        self.storage.client.put_object(
+            Bucket="media", Key=key, Body=content.getvalue()
+        )
+        _, _, etag = self.storage.read_range(key, 1024)
+
+        self.storage.client.put_object(
+            Bucket="media", Key=key, Body=b"#!/bin/sh\necho hello\n"
+        )
+
+        with self.assertRaises(UploadModified):
+            self.storage.import_upload(key, "uploads/posts/image.png", etag)
+
+        listing = self.storage.client.list_objects_v2(
+            Bucket="media", Prefix="uploads/"
+        )
+        self.assertEqual(listing["KeyCount"], 0)
+
+    def test_token_of_other_post_is_rejected(self):
+        post = sample_post(self.user)
+        other_post = sample_post(self.user)
+        content = io.BytesIO()
+        Image.new("RGB", (40, 20)).save(content, "PNG")
+        token = self.upload(post, content.getvalue(), "image/png")
+
+        res = self.client.post(complete_url(other_post.id), {"token": token})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(PostImage.objects.exists())
+
+    def test_presign_for_post_of_other_user_is_forbidden(self):
+        post = sample_post(sample_user(email="sample@user.com"))
+
+        res = self.client.post(
+            presign_url(post.id), {"content_type": "image/png"}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
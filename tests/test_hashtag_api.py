@@ -1,14 +1,19 @@
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 from django.urls import reverse
+from django.utils.timezone import now
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from feed.models import Hashtag
+from feed.models import Hashtag, Post, PostHashtag
 from feed.serializers import HashtagListSerializer, HashtagDetailSerializer
+from tests.test_user_info_api import viewer_context
 
 HASHTAG_LIST_URL = reverse("feed:hashtag-list")
 HASHTAG_DETAIL_URL = reverse("feed:hashtag-detail", args=[1])
+HASHTAG_POSTS_URL = reverse("feed:hashtag-posts", args=[1])
 
 
 def sample_hashtag(**params) -> Hashtag:
@@ -57,13 +62,65 @@ class AuthenticatedHashtagApiTests(TestCase):
 
     def test_retrieve_hashtag_detail(self):
         hashtag = sample_hashtag()
+        hashtag.first_page_posts = []
+        hashtag.posts_next_url = None
 
         res = self.client.get(HASHTAG_DETAIL_URL)
 
-        serializer = HashtagDetailSerializer(hashtag)
+        serializer = HashtagDetailSerializer(
+            hashtag, context=viewer_context(self.user)
+        )
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_retrieve_hashtag_detail_embeds_first_page_of_posts(self):
+        hashtag = sample_hashtag()
+        posts = []
+        for _ in range(3):
+            post = Post.objects.create(author=self.user, text="Sample text.")
+            post.hashtags.add(
+                hashtag, through_defaults=post.get_hashtag_link_defaults()
+            )
+            posts.append(post)
+        unpublished_post = Post.objects.create(
+            author=self.user, text="Sample text.", is_published=False
+        )
+        unpublished_post.hashtags.add(
+            hashtag,
+            through_defaults=unpublished_post.get_hashtag_link_defaults(),
+        )
+
+        res = self.client.get(HASHTAG_DETAIL_URL, {"page_size": 2})
+
+        res_ids = [post["id"] for post in res.data["posts"]]
+        self.assertEqual(res_ids, [posts[2].id, posts[1].id])
+        self.assertIn(HASHTAG_POSTS_URL, res.data["posts_next_url"])
+
+        res = self.client.get(res.data["posts_next_url"])
+        res_ids = [post["id"] for post in res.json()["results"]]
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res_ids, [posts[0].id])
+        self.assertIsNone(res.json()["next"])
+
+    def test_hashtag_links_follow_post_publishing(self):
+        hashtag = sample_hashtag()
+        post = Post.objects.create(
+            author=self.user,
+            text="Sample text.",
+            is_published=False,
+            published_at=now() + timedelta(minutes=15),
+        )
+        post.hashtags.add(
+            hashtag, through_defaults=post.get_hashtag_link_defaults()
+        )
+
+        post.publish()
+        link = PostHashtag.objects.get(post=post, hashtag=hashtag)
+
+        self.assertTrue(link.is_published)
+        self.assertEqual(link.published_at, post.published_at)
+
     def test_create_hashtag_forbidden(self):
         res = self.client.post(HASHTAG_LIST_URL, self.payload)
 
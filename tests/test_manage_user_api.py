@@ -8,6 +8,7 @@ from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
+from feed.models import Blob
 from user.serializers import ManageUserProfileSerializer
 
 USER_MANAGE_URL = reverse("user:manage-detail")
@@ -115,3 +116,25 @@ class AuthenticatedManageUserApiTests(TestCase):
 
         self.assertEqual(res.status_code, status.HTTP_201_CREATED)
         self.assertIsNotNone(self.user.profile_image)
+
+    def test_profile_image_references_are_counted(self):
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.new("RGB", (10, 10))
+            img.save(ntf, format="JPEG")
+            ntf.seek(0)
+            self.client.post(
+                USER_UPLOAD_PROFILE_IMAGE_URL,
+                {"profile_image": ntf},
+                format="multipart",
+            )
+
+        self.user.refresh_from_db()
+        blob = Blob.objects.get(name=self.user.profile_image.name)
+
+        self.assertEqual(blob.ref_count, 1)
+
+        self.client.delete(USER_DELETE_PROFILE_IMAGE_URL)
+        blob.refresh_from_db()
+
+        self.assertEqual(blob.ref_count, 0)
+        self.assertIsNotNone(blob.released_at)
@@ -0,0 +1,172 @@
+import hashlib
+import os
+import shutil
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+
+from feed.models import PostImage, PostImageRendition
+from tests.test_post_api import sample_post
+from tests.test_user_info_api import sample_user
+
+CONTENT = b"image content"
+CONTENT_HASH = hashlib.sha256(CONTENT).hexdigest()
+BLOB_NAME = (
+    f"uploads/posts/{CONTENT_HASH[:2]}/{CONTENT_HASH[2:4]}/{CONTENT_HASH}.jpg"
+)
+LEGACY_NAME = "uploads/posts/user_2024-01-01_10-00-00-image.jpg"
+POSTPONED_NAME = "uploads/posts/user_2024-01-01_10-00-00-postponed.jpg"
+RENDITION_NAME = "uploads/posts/renditions/postponed-feed.webp"
+ORPHAN_NAME = "uploads/posts/user_2024-01-01_10-00-00-orphan.jpg"
+
+
+def media_url(name: str) -> str:
+    return reverse("media", kwargs={"path": name})
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media_root, MEDIA_SENDFILE_HEADER=None
+        )
+        self.settings_override.enable()
+
+        for name in (
+            BLOB_NAME,
+            LEGACY_NAME,
+            POSTPONED_NAME,
+            RENDITION_NAME,
+            ORPHAN_NAME,
+            "uploads/posts/.upload-1",
+        ):
+            path = os.path.join(self.media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as file:
+                file.write(CONTENT)
+
+        self.author = sample_user()
+        post = sample_post(self.author)
+        postponed_post = sample_post(self.author, is_published=False)
+        PostImage.objects.create(post=post, image=BLOB_NAME)
+        PostImage.objects.create(post=post, image=LEGACY_NAME)
+        image = PostImage.objects.create(
+            post=postponed_post, image=POSTPONED_NAME
+        )
+        PostImageRendition.objects.create(
+            image=image,
+            kind=PostImageRendition.Kind.FEED,
+            file=RENDITION_NAME,
+            width=10,
+            height=10,
+        )
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_content_addressed_file_is_immutable(self):
+        res = self.client.get(media_url(BLOB_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(res.streaming_content), CONTENT)
+        self.assertEqual(res["ETag"], f'"{CONTENT_HASH}"')
+        self.assertIn("immutable", res["Cache-Control"])
+        self.assertIn("public", res["Cache-Control"])
+
+    def test_content_addressed_file_not_modified(self):
+        res = self.client.get(
+            media_url(BLOB_NAME), HTTP_IF_NONE_MATCH=f'"{CONTENT_HASH}"'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res["ETag"], f'"{CONTENT_HASH}"')
+
+    def test_legacy_file_is_revalidated(self):
+        res = self.client.get(media_url(LEGACY_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Cache-Control"], "public, no-cache")
+        self.assertNotIn("ETag", res)
+
+        res = self.client.get(
+            media_url(LEGACY_NAME),
+            HTTP_IF_MODIFIED_SINCE=res["Last-Modified"],
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    @override_settings(MEDIA_SENDFILE_HEADER="X-Accel-Redirect")
+    def test_delivery_is_handed_to_nginx(self):
+        res = self.client.get(media_url(BLOB_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b"")
+        self.assertEqual(
+            res["X-Accel-Redirect"], f"/protected-media/{BLOB_NAME}"
+        )
+        self.assertEqual(res["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", res["Cache-Control"])
+
+    @override_settings(
+        MEDIA_SENDFILE_HEADER="X-Accel-Redirect",
+        MEDIA_ACCEL_REDIRECT_PREFIX="/internal/media",
+    )
+    def test_delivery_uses_configured_nginx_location(self):
+        res = self.client.get(media_url(BLOB_NAME))
+
+        self.assertEqual(
+            res["X-Accel-Redirect"], f"/internal/media/{BLOB_NAME}"
+        )
+
+    @override_settings(MEDIA_SENDFILE_HEADER="X-Sendfile")
+    def test_delivery_is_handed_to_sendfile_proxy(self):
+        res = self.client.get(media_url(BLOB_NAME))
+
+        self.assertEqual(
+            res["X-Sendfile"], os.path.join(self.media_root, BLOB_NAME)
+        )
+
+    def test_image_of_postponed_post_is_served_to_author_only(self):
+        for name in (POSTPONED_NAME, RENDITION_NAME):
+            res = self.client.get(media_url(name))
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.force_login(sample_user())
+        res = self.client.get(media_url(POSTPONED_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.client.logout()
+        token = Token.objects.create(user=self.author)
+        res = self.client.get(
+            media_url(POSTPONED_NAME), HTTP_AUTHORIZATION=f"Token {token.key}"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res["Cache-Control"], "private, no-cache")
+
+    def test_hidden_missing_and_unowned_files_are_not_found(self):
+        for name in (
+            "uploads/posts/.upload-1",
+            "uploads/posts/missing.jpg",
+            "uploads/posts",
+            ORPHAN_NAME,
+        ):
+            res = self.client.get(media_url(name))
+
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_files_outside_media_root_are_not_found(self):
+        res = self.client.get("/media/..%2F..%2Fetc%2Fpasswd")
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unsafe_methods_are_not_allowed(self):
+        res = self.client.post(media_url(BLOB_NAME))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -1,16 +1,39 @@
 import json
+from io import StringIO
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import IntegrityError, connection
 from django.db.models import Count, OuterRef, Exists, QuerySet
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from feed.models import Post, Like
+from feed.likes import (
+    LIKE_BUFFER_KEY,
+    LIKE_FLUSH_LOCK_KEY,
+    LIKE_FLUSHING_KEY,
+    toggle_buffered_like,
+)
+from feed.models import Hashtag, HashtagManager, Post, Like, TimelineEntry
 from feed.serializers import PostListSerializer, PostDetailSerializer
+from feed.tasks import (
+    backfill_timeline,
+    delete_orphan_hashtags,
+    flush_like_buffer,
+    purge_timeline,
+    push_post_to_timelines,
+)
+from feed.timeline import backfill_all
+from feed.viewer_state import ViewerState
+from social_media_api.redis_client import get_redis
 from tests.test_hashtag_api import sample_hashtag
-from tests.test_user_info_api import sample_user
+from tests.test_user_info_api import sample_user, viewer_context
+from user.counters import reconcile_follow_counters
+from user.follows import toggle_follow
 from user.models import User, Follow
 from user.serializers import UserInfoListSerializer
 
@@ -109,14 +132,55 @@ class AuthenticatedPostApiTests(TestCase):
 
         posts = get_annotated_posts_list(self.user)
 
-        serializer1 = PostListSerializer(posts.get(id=post_without_like.id))
-        serializer2 = PostListSerializer(posts.get(id=post_with_like1.id))
-        serializer3 = PostListSerializer(posts.get(id=post_with_like2.id))
+        serializer1 = PostListSerializer(
+            posts.get(id=post_without_like.id),
+            context=viewer_context(self.user),
+        )
+        serializer2 = PostListSerializer(
+            posts.get(id=post_with_like1.id), context=viewer_context(self.user)
+        )
+        serializer3 = PostListSerializer(
+            posts.get(id=post_with_like2.id), context=viewer_context(self.user)
+        )
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertNotIn(serializer1.data, res.json())
-        self.assertIn(serializer2.data, res.json())
-        self.assertIn(serializer3.data, res.json())
+        self.assertNotIn(serializer1.data, res.json()["results"])
+        self.assertIn(serializer2.data, res.json()["results"])
+        self.assertIn(serializer3.data, res.json()["results"])
+
+    def test_get_liked_posts_is_paginated_by_cursor(self):
+        user = sample_user()
+        for _ in range(3):
+            Like.objects.create(post=sample_post(user), user=self.user)
+
+        with self.assertNumQueries(3):
+            res = self.client.get(LIKED_POSTS_URL, {"page_size": 2})
+
+        self.assertEqual(len(res.json()["results"]), 2)
+        self.assertNotIn("count", res.json())
+
+        res = self.client.get(res.json()["next"])
+
+        self.assertEqual(len(res.json()["results"]), 1)
+        self.assertIsNone(res.json()["next"])
+
+    def test_viewer_state_resolves_likes_of_page_at_once(self):
+        posts = [sample_post(self.user) for _ in range(3)]
+        Like.objects.create(post=posts[1], user=self.user)
+        viewer_state = ViewerState(self.user)
+
+        with self.assertNumQueries(1):
+            viewer_state.resolve_likes(post.id for post in posts)
+
+        with self.assertNumQueries(0):
+            liked = [viewer_state.has_liked(post.id) for post in posts]
+
+        self.assertEqual(liked, [False, True, False])
+
+    def test_invalid_cursor(self):
+        res = self.client.get(LIKED_POSTS_URL, {"cursor": "invalid"})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
 
     def test_get_followed_authors_posts(self):
         not_followed_user = sample_user(email="not_followed@user.com")
@@ -127,31 +191,156 @@ class AuthenticatedPostApiTests(TestCase):
         post_of_followed_user1 = sample_post(followed_user)
         post_of_followed_user2 = sample_post(followed_user)
 
+        for post in (
+            post_of_not_followed_user,
+            post_of_followed_user1,
+            post_of_followed_user2,
+        ):
+            push_post_to_timelines(post.id)
+
         posts = get_annotated_posts_list(self.user)
 
         serializer1 = PostListSerializer(
-            posts.get(id=post_of_not_followed_user.id)
+            posts.get(id=post_of_not_followed_user.id),
+            context=viewer_context(self.user),
         )
         serializer2 = PostListSerializer(
-            posts.get(id=post_of_followed_user1.id)
+            posts.get(id=post_of_followed_user1.id),
+            context=viewer_context(self.user),
         )
         serializer3 = PostListSerializer(
-            posts.get(id=post_of_followed_user2.id)
+            posts.get(id=post_of_followed_user2.id),
+            context=viewer_context(self.user),
         )
 
         res = self.client.get(FOLLOWED_AUTHORS_POSTS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertNotIn(serializer1.data, res.json())
-        self.assertIn(serializer2.data, res.json())
-        self.assertIn(serializer3.data, res.json())
+        self.assertNotIn(serializer1.data, res.json()["results"])
+        self.assertIn(serializer2.data, res.json()["results"])
+        self.assertIn(serializer3.data, res.json()["results"])
+
+    def test_followed_authors_posts_are_paginated_by_cursor(self):
+        followed_user = sample_user(email="followed@user.com")
+        Follow.objects.create(follower=self.user, following=followed_user)
+
+        for _ in range(3):
+            push_post_to_timelines(sample_post(followed_user).id)
+
+        res = self.client.get(FOLLOWED_AUTHORS_POSTS_URL, {"page_size": 2})
+        first_page = [post["id"] for post in res.json()["results"]]
+
+        res = self.client.get(res.json()["next"])
+        second_page = [post["id"] for post in res.json()["results"]]
+
+        self.assertEqual(len(first_page), 2)
+        self.assertEqual(len(second_page), 1)
+        self.assertIsNone(res.json()["next"])
+        self.assertFalse(set(first_page) & set(second_page))
+
+    @override_settings(TIMELINE_FANOUT_FOLLOWER_THRESHOLD=2)
+    def test_followed_authors_posts_merges_pulled_authors(self):
+        popular_author = sample_user(email="popular@user.com")
+        regular_author = sample_user(email="regular@user.com")
+        Follow.objects.create(follower=self.user, following=popular_author)
+        Follow.objects.create(follower=self.user, following=regular_author)
+        Follow.objects.create(
+            follower=sample_user(email="fan@user.com"),
+            following=popular_author,
+        )
+        reconcile_follow_counters()
+
+        posts = [
+            sample_post(popular_author),
+            sample_post(regular_author),
+            sample_post(popular_author),
+        ]
+        pushed = [push_post_to_timelines(post.id) for post in posts]
+
+        res = self.client.get(FOLLOWED_AUTHORS_POSTS_URL)
+        res_ids = [post["id"] for post in res.json()["results"]]
+
+        self.assertEqual(pushed, [0, 1, 0])
+        self.assertEqual(res_ids, [post.id for post in reversed(posts)])
+
+    @override_settings(TIMELINE_FANOUT_FOLLOWER_THRESHOLD=2)
+    def test_demoted_author_posts_are_backfilled(self):
+        author = sample_user(email="author@user.com")
+        fan = sample_user(email="fan@user.com")
+        Follow.objects.create(follower=self.user, following=author)
+        Follow.objects.create(follower=fan, following=author)
+        reconcile_follow_counters()
+
+        post = sample_post(author)
+        self.assertEqual(push_post_to_timelines(post.id), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_follow(fan.id, author.id)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_timeline_backfill_and_purge(self):
+        author = sample_user(email="author@user.com")
+        post = sample_post(author)
+        Follow.objects.create(follower=self.user, following=author)
+
+        backfill_timeline(self.user.id, author.id)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+        Follow.objects.filter(follower=self.user, following=author).delete()
+        purge_timeline(self.user.id, author.id)
+
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_timeline_tasks_act_on_current_follow(self):
+        author = sample_user(email="author@user.com")
+        post = sample_post(author)
+
+        # Backfill of a follow undone before the task ran
+        backfill_timeline(self.user.id, author.id)
+
+        self.assertFalse(TimelineEntry.objects.filter(user=self.user).exists())
+
+        # Purge of an unfollow redone before the task ran
+        Follow.objects.create(follower=self.user, following=author)
+        backfill_timeline(self.user.id, author.id)
+        purge_timeline(self.user.id, author.id)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+
+    def test_backfill_timelines_command(self):
+        author = sample_user(email="author@user.com")
+        post = sample_post(author)
+        Follow.objects.create(follower=self.user, following=author)
+        out = StringIO()
+
+        call_command("backfill_timelines", stdout=out)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.user, post=post).exists()
+        )
+        self.assertIn("Added 1 timeline entries.", out.getvalue())
+
+        # Entries the timelines already have are not counted
+        self.assertEqual(backfill_all(), 0)
 
     def test_retrieve_post_detail(self):
         post = sample_post(self.user)
         posts = get_annotated_post_detail(self.user)
 
         res = self.client.get(POST_DETAIL_URL)
-        serializer = PostDetailSerializer(posts.get(id=post.id))
+        serializer = PostDetailSerializer(
+            posts.get(id=post.id), context=viewer_context(self.user)
+        )
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
@@ -172,9 +361,27 @@ class AuthenticatedPostApiTests(TestCase):
         res = self.client.get(USERS_WHO_LIKED_POST_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertNotIn(serializer1.data, res.json())
-        self.assertIn(serializer2.data, res.json())
-        self.assertIn(serializer3.data, res.json())
+        self.assertNotIn(serializer1.data, res.json()["results"])
+        self.assertIn(serializer2.data, res.json()["results"])
+        self.assertIn(serializer3.data, res.json()["results"])
+
+    def test_users_who_liked_post_are_paginated_by_like_time(self):
+        post = sample_post(self.user)
+        users = [sample_user() for _ in range(3)]
+
+        for user in (users[1], users[0], users[2]):
+            Like.objects.create(post=post, user=user)
+
+        res = self.client.get(USERS_WHO_LIKED_POST_URL, {"page_size": 2})
+
+        res_ids = [user["id"] for user in res.json()["results"]]
+        self.assertEqual(res_ids, [users[2].id, users[0].id])
+
+        res = self.client.get(res.json()["next"])
+
+        res_ids = [user["id"] for user in res.json()["results"]]
+        self.assertEqual(res_ids, [users[1].id])
+        self.assertIsNone(res.json()["next"])
 
     def test_post_like_toggle(self):
         post = sample_post(self.user)
@@ -196,6 +403,149 @@ class AuthenticatedPostApiTests(TestCase):
             Like.objects.filter(post=post, user=self.user).exists()
         )
 
+    def test_unlike_does_not_decrement_drifted_like_count_below_zero(self):
+        post = sample_post(self.user)
+        Like.objects.create(user=self.user, post=post)
+
+        res = self.client.get(POST_LIKE_TOGGLE_URL)
+        post.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        self.assertFalse(Like.objects.filter(post=post).exists())
+        self.assertEqual(post.like_count, 0)
+
+    def test_post_like_toggle_updates_like_count(self):
+        post = sample_post(self.user)
+
+        self.client.get(POST_LIKE_TOGGLE_URL)
+        post.refresh_from_db()
+
+        self.assertEqual(post.like_count, 1)
+
+        self.client.get(POST_LIKE_TOGGLE_URL)
+        post.refresh_from_db()
+
+        self.assertEqual(post.like_count, 0)
+
+    @override_settings(REDIS_URL=None, LIKE_WRITE_BEHIND=True)
+    def test_buffered_like_toggle_is_flushed_in_batch(self):
+        get_redis().flushdb()
+        post = sample_post(self.user)
+        other_post = sample_post(self.user)
+        Like.objects.create(user=self.user, post=other_post)
+        Post.objects.filter(id=other_post.id).update(like_count=1)
+
+        # Like, unlike and like again before the buffer is flushed
+        for _ in range(3):
+            self.client.get(POST_LIKE_TOGGLE_URL)
+        self.client.get(reverse("feed:post-like-toggle", args=[other_post.id]))
+
+        self.assertFalse(
+            Like.objects.filter(post=post, user=self.user).exists()
+        )
+
+        num_flushed = flush_like_buffer()
+        post.refresh_from_db()
+        other_post.refresh_from_db()
+
+        self.assertEqual(num_flushed, 2)
+        self.assertTrue(
+            Like.objects.filter(post=post, user=self.user).exists()
+        )
+        self.assertFalse(
+            Like.objects.filter(post=other_post, user=self.user).exists()
+        )
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(other_post.like_count, 0)
+        self.assertEqual(flush_like_buffer(), 0)
+
+    @override_settings(REDIS_URL=None, LIKE_WRITE_BEHIND=True)
+    def test_buffered_like_toggle_during_flush(self):
+        redis = get_redis()
+        redis.flushdb()
+        post = sample_post(self.user)
+
+        self.client.get(POST_LIKE_TOGGLE_URL)
+        # The batch is taken by a flush which has not committed yet
+        redis.rename(LIKE_BUFFER_KEY, LIKE_FLUSHING_KEY)
+
+        self.assertFalse(toggle_buffered_like(self.user.id, post.id))
+
+        # The batch left by the flush is persisted first
+        self.assertEqual(flush_like_buffer(), 1)
+        self.assertTrue(Like.objects.filter(post=post).exists())
+
+        self.assertEqual(flush_like_buffer(), 1)
+        post.refresh_from_db()
+
+        self.assertFalse(Like.objects.filter(post=post).exists())
+        self.assertEqual(post.like_count, 0)
+
+    @override_settings(REDIS_URL=None, LIKE_WRITE_BEHIND=True)
+    def test_buffered_likes_are_not_applied_twice(self):
+        redis = get_redis()
+        redis.flushdb()
+        post = sample_post(self.user)
+
+        self.client.get(POST_LIKE_TOGGLE_URL)
+
+        # The flush fails after the likes are committed
+        with mock.patch.object(
+            type(redis), "hdel", side_effect=ConnectionError
+        ):
+            with self.assertRaises(ConnectionError):
+                flush_like_buffer()
+
+        self.assertTrue(redis.exists(LIKE_FLUSHING_KEY))
+
+        self.assertEqual(flush_like_buffer(), 0)
+        post.refresh_from_db()
+
+        self.assertTrue(Like.objects.filter(post=post).exists())
+        self.assertEqual(post.like_count, 1)
+        self.assertFalse(redis.exists(LIKE_FLUSHING_KEY))
+
+    @override_settings(REDIS_URL=None, LIKE_WRITE_BEHIND=True)
+    def test_buffered_likes_flush_keeps_lock_of_other_flush(self):
+        redis = get_redis()
+        redis.flushdb()
+        sample_post(self.user)
+        lock = redis.lock(LIKE_FLUSH_LOCK_KEY)
+        lock.acquire()
+
+        self.client.get(POST_LIKE_TOGGLE_URL)
+
+        self.assertEqual(flush_like_buffer(), 0)
+        self.assertTrue(redis.exists(LIKE_FLUSH_LOCK_KEY))
+
+        lock.release()
+
+        self.assertEqual(flush_like_buffer(), 1)
+        self.assertFalse(redis.exists(LIKE_FLUSH_LOCK_KEY))
+
+    def test_add_post_comment_updates_comment_count(self):
+        post = sample_post(self.user)
+
+        self.client.post(
+            POST_ADD_COMMENT_URL,
+            json.dumps(self.payload),
+            content_type="application/json",
+        )
+        post.refresh_from_db()
+
+        self.assertEqual(post.comment_count, 1)
+
+    def test_reconcile_post_counters(self):
+        post = sample_post(self.user)
+        Like.objects.create(post=post, user=sample_user())
+        Post.objects.filter(id=post.id).update(comment_count=5)
+
+        call_command("reconcile_post_counters", stdout=StringIO())
+        post.refresh_from_db()
+
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(post.comment_count, 0)
+
     def test_add_post_comment(self):
         sample_post(self.user)
         json_data = json.dumps(self.payload)
@@ -243,6 +593,79 @@ class AuthenticatedPostApiTests(TestCase):
         self.assertIn(hashtag1["name"], res_hashtags)
         self.assertIn(hashtag2["name"], res_hashtags)
 
+    def test_create_post_with_hashtag_deleted_as_orphan(self):
+        bulk_create = HashtagManager.bulk_create
+
+        # The hashtag is created by a concurrent request, which makes
+        # this insert conflict, and deleted as an orphan right after
+        def create_conflicting_orphan(manager, objs, **kwargs):
+            bulk_create(manager, objs, **kwargs)
+            Hashtag.objects.filter(
+                name__in=[obj.name for obj in objs]
+            ).delete()
+            return []
+
+        payload = self.payload
+        payload["hashtags"] = [{"name": "racing"}]
+        calls = iter([create_conflicting_orphan, bulk_create])
+
+        with mock.patch.object(
+            HashtagManager,
+            "bulk_create",
+            autospec=True,
+            side_effect=lambda *args, **kwargs: next(calls)(*args, **kwargs),
+        ):
+            res = self.client.post(
+                POST_CREATE_URL,
+                json.dumps(payload),
+                content_type="application/json",
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [dict(hashtag)["name"] for hashtag in res.data["hashtags"]],
+            ["racing"],
+        )
+        self.assertTrue(
+            Post.objects.get(id=res.data["id"])
+            .hashtags.filter(name="racing")
+            .exists()
+        )
+
+    def test_create_post_resolves_hashtags_in_bulk(self):
+        sample_hashtag(name="Existing")
+        payload = self.payload
+        payload["hashtags"] = [{"name": f"tag_{i}"} for i in range(20)]
+        payload["hashtags"].append({"name": "existing"})
+        json_data = json.dumps(payload)
+
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.post(
+                POST_CREATE_URL,
+                json_data,
+                content_type="application/json",
+            )
+
+        num_hashtag_queries = len(
+            [
+                query
+                for query in context.captured_queries
+                if "feed_hashtag" in query["sql"]
+                or "feed_post_hashtags" in query["sql"]
+            ]
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertLessEqual(num_hashtag_queries, 5)
+        self.assertEqual(Hashtag.objects.count(), 21)
+        self.assertEqual(Post.objects.get().hashtags.count(), 21)
+
+    def test_hashtag_names_are_unique_ignoring_case(self):
+        sample_hashtag(name="Sample")
+
+        with self.assertRaises(IntegrityError):
+            sample_hashtag(name="sample")
+
     def test_put_post_by_not_author_is_forbidden(self):
         author = sample_user()
         sample_post(author)
@@ -324,3 +747,41 @@ class AuthorPostApiTests(TestCase):
         res = self.client.delete(POST_DETAIL_URL)
 
         self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_orphan_hashtags_are_deleted_by_task(self):
+        post = sample_post(self.user)
+        orphan = sample_hashtag(name="orphan")
+        shared = sample_hashtag(name="shared")
+        post.add_hashtags([orphan, shared])
+        sample_post(sample_user()).add_hashtags([shared])
+
+        payload = {"text": "Test text.", "hashtags": [{"name": "new"}]}
+        self.client.put(
+            POST_DETAIL_URL,
+            json.dumps(payload),
+            content_type="application/json",
+        )
+
+        self.assertTrue(Hashtag.objects.filter(id=orphan.id).exists())
+
+        num_deleted = delete_orphan_hashtags()
+
+        self.assertEqual(num_deleted, 1)
+        self.assertFalse(Hashtag.objects.filter(id=orphan.id).exists())
+        self.assertTrue(Hashtag.objects.filter(id=shared.id).exists())
+
+    def test_orphan_hashtags_are_checked_again_when_deleted(self):
+        sample_hashtag(name="orphan")
+
+        with CaptureQueriesContext(connection) as queries:
+            delete_orphan_hashtags()
+
+        # Hashtags linked after being selected must not be deleted
+        selects = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith("SELECT")
+        ]
+        self.assertTrue(
+            any(" IN (" in sql and "NOT EXISTS" in sql for sql in selects)
+        )
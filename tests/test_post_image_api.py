@@ -1,14 +1,25 @@
+import hashlib
+import io
 import os
 import tempfile
+from datetime import timedelta
+from unittest import mock
 
 from PIL import Image
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils.timezone import now
+from freezegun import freeze_time
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from feed.models import PostImage
+from feed.models import Blob, PostImage, PostImageRendition
+from feed.renditions import generate_renditions, render_renditions
+from feed.serializers import PostImageListSerializer
+from feed.tasks import delete_unreferenced_blobs
 from tests.test_post_api import sample_post
 from tests.test_user_info_api import sample_user
 
@@ -100,3 +111,256 @@ class AuthorPostImageApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_302_FOUND)
         self.assertEqual(post.images.count(), 1)
         self.assertTrue(os.path.exists(image.image.path))
+
+    def test_post_image_upload_generates_renditions(self):
+        post = sample_post(self.user)
+
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            img = Image.new("RGB", (3000, 1500))
+            img.save(ntf, format="JPEG")
+            ntf.seek(0)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    UPLOAD_POST_IMAGE_URL, {"image": ntf}, format="multipart"
+                )
+
+        image = post.images.get()
+        dimensions = {
+            rendition.kind: (rendition.width, rendition.height)
+            for rendition in image.renditions.all()
+        }
+
+        self.assertEqual(
+            dimensions,
+            {
+                "thumbnail": (320, 160),
+                "feed": (1080, 540),
+                "full": (2048, 1024),
+            },
+        )
+
+        serializer = PostImageListSerializer(image)
+        feed_rendition = image.get_rendition("feed")
+
+        self.assertEqual(serializer.data["image"], feed_rendition.file.url)
+        self.assertTrue(os.path.exists(feed_rendition.file.path))
+
+    def test_renditions_of_image_deleted_while_rendering(self):
+        post = sample_post(self.user)
+        self.upload_image(post, Image.new("RGB", (40, 20), color="yellow"))
+        image = post.images.get()
+        image.renditions.all().delete()
+        rendered = {}
+
+        # The image is not locked while its renditions are rendered
+        def render_and_delete(post_image, sizes):
+            rendered.update(render_renditions(post_image, sizes))
+            PostImage.objects.filter(id=post_image.id).delete()
+            return rendered
+
+        with mock.patch(
+            "feed.renditions.render_renditions", side_effect=render_and_delete
+        ):
+            self.assertEqual(generate_renditions(image.id), 0)
+
+        self.assertEqual(len(rendered), 3)
+        self.assertFalse(PostImageRendition.objects.exists())
+        for rendition in rendered.values():
+            blob = Blob.objects.get(name=rendition.file.name)
+            self.assertEqual(blob.ref_count, 0)
+            self.assertIsNotNone(blob.released_at)
+
+    def upload_image(self, post, image) -> None:
+        with tempfile.NamedTemporaryFile(suffix=".jpg") as ntf:
+            image.save(ntf, format="JPEG")
+            ntf.seek(0)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    reverse("feed:post-image-upload", args=[post.id]),
+                    {"image": ntf},
+                    format="multipart",
+                )
+
+    def test_identical_images_share_stored_files(self):
+        posts = [sample_post(self.user) for _ in range(2)]
+        image = Image.new("RGB", (40, 20), color="red")
+
+        for post in posts:
+            self.upload_image(post, image)
+
+        image1, image2 = PostImage.objects.order_by("id")
+        renditions1 = {r.kind: r.file.name for r in image1.renditions.all()}
+        renditions2 = {r.kind: r.file.name for r in image2.renditions.all()}
+
+        self.assertEqual(image1.image.name, image2.image.name)
+        self.assertEqual(renditions1, renditions2)
+        self.assertEqual(Blob.objects.get(name=image1.image.name).ref_count, 2)
+
+    def test_unreferenced_blobs_are_deleted(self):
+        post = sample_post(self.user)
+        self.upload_image(post, Image.new("RGB", (40, 20), color="blue"))
+        image = post.images.get()
+        # Renditions of a small image are identical and share one file
+        names = {image.image.name} | {
+            rendition.file.name for rendition in image.renditions.all()
+        }
+
+        image.delete()
+
+        self.assertFalse(Blob.objects.filter(ref_count__gt=0).exists())
+        self.assertEqual(delete_unreferenced_blobs(), 0)
+
+        with freeze_time(now() + timedelta(hours=2)):
+            self.assertEqual(delete_unreferenced_blobs(), len(names))
+
+        for name in names:
+            self.assertFalse(image.image.storage.exists(name))
+        self.assertFalse(Blob.objects.exists())
+
+    def test_unreferenced_blob_files_are_removed_from_disk(self):
+        post = sample_post(self.user)
+        self.upload_image(post, Image.new("RGB", (40, 20), color="green"))
+        image = post.images.get()
+        path = os.path.join(settings.MEDIA_ROOT, image.image.name)
+
+        self.assertTrue(os.path.isfile(path))
+
+        image.delete()
+
+        with freeze_time(now() + timedelta(hours=2)):
+            delete_unreferenced_blobs.delay()
+
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(Blob.objects.filter(name=image.image.name).exists())
+
+    def post_file(self, post, name: str, content: bytes):
+        return self.client.post(
+            reverse("feed:post-image-upload", args=[post.id]),
+            {"image": SimpleUploadedFile(name, content)},
+            format="multipart",
+        )
+
+    def test_upload_with_dotted_filename_uses_sniffed_format(self):
+        post = sample_post(self.user)
+        content = io.BytesIO()
+        Image.new("RGB", (10, 10)).save(content, format="PNG")
+
+        res = self.post_file(post, "my.holiday.photo.jpg", content.getvalue())
+
+        image = post.images.get()
+
+        self.assertEqual(res.status_code, status.HTTP_302_FOUND)
+        self.assertTrue(image.image.name.endswith(".png"))
+        self.assertEqual(
+            os.path.basename(image.image.name),
+            f"{hashlib.sha256(content.getvalue()).hexdigest()}.png",
+        )
+
+    def test_upload_of_non_image_is_rejected(self):
+        post = sample_post(self.user)
+
+        res = self.post_file(post, "image.jpg", b"#!/bin/sh\necho hello\n")
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", res.data)
+        self.assertFalse(post.images.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=1024)
+    def test_oversized_upload_is_rejected(self):
+        post = sample_post(self.user)
+        content = io.BytesIO()
+        Image.effect_noise((100, 100), 64).save(content, format="PNG")
+
+        res = self.post_file(post, "image.png", content.getvalue())
+
+        self.assertEqual(
+            res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+        self.assertFalse(post.images.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=100)
+    def test_upload_with_too_many_pixels_is_rejected(self):
+        post = sample_post(self.user)
+        content = io.BytesIO()
+        Image.new("RGB", (20, 20)).save(content, format="PNG")
+
+        res = self.post_file(post, "image.png", content.getvalue())
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(post.images.exists())
+
+
+class PostImageBatchUploadApiTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        PostImage.objects.all().delete()
+
+    @staticmethod
+    def sample_files(colors: list[str]) -> list[SimpleUploadedFile]:
+        files = []
+
+        for color in colors:
+            content = io.BytesIO()
+            Image.new("RGB", (40, 20), color=color).save(content, "PNG")
+            files.append(
+                SimpleUploadedFile(f"{color}.png", content.getvalue())
+            )
+
+        return files
+
+    def test_batch_upload(self):
+        post = sample_post(self.user)
+        files = self.sample_files(["red", "green", "blue"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                reverse("feed:post-image-batch-upload", args=[post.id]),
+                {"images": files},
+                format="multipart",
+            )
+
+        images = post.images.order_by("id")
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data), 3)
+        self.assertEqual(images.count(), 3)
+
+        for image in images:
+            self.assertEqual(image.renditions.count(), 3)
+            self.assertEqual(
+                Blob.objects.get(name=image.image.name).ref_count, 1
+            )
+
+    def test_batch_upload_to_post_of_other_user_is_forbidden(self):
+        post = sample_post(sample_user(email="sample@user.com"))
+
+        res = self.client.post(
+            reverse("feed:post-image-batch-upload", args=[post.id]),
+            {"images": self.sample_files(["red"])},
+            format="multipart",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(post.images.exists())
+
+    def test_batch_upload_rejects_too_many_files(self):
+        post = sample_post(self.user)
+        colors = ["red"] * (settings.POST_IMAGE_BATCH_MAX_FILES + 1)
+
+        res = self.client.post(
+            reverse("feed:post-image-batch-upload", args=[post.id]),
+            {"images": self.sample_files(colors)},
+            format="multipart",
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(post.images.exists())
@@ -6,15 +6,17 @@ from django.urls import reverse
 from django.utils.timezone import now
 from freezegun import freeze_time
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.test import APIClient
 
-from feed.models import Post
+from feed.models import Hashtag, Post, PostHashtag, TimelineEntry
 from feed.serializers import (
     PostponedPostListSerializer,
     PostponedPostDetailSerializer,
 )
+from feed.tasks import publish_due_posts
 from tests.test_user_info_api import sample_user
-from user.models import User
+from user.models import Follow, User
 
 POSTPONED_POST_LIST_URL = reverse("feed:postponed-post-list")
 POSTPONED_POST_DETAIL_URL = reverse("feed:postponed-post-detail", args=[1])
@@ -108,3 +110,68 @@ class AuthorPostponedPostApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_302_FOUND)
         self.assertTrue(post.is_published)
         self.assertEqual(post.published_at, published_at)
+
+    def test_publish_due_posts(self):
+        follower = sample_user()
+        Follow.objects.create(follower=follower, following=self.user)
+        hashtag = Hashtag.objects.create(name="due")
+        due_posts = [
+            sample_postponed_post(
+                self.user, published_at=now() - timedelta(minutes=1)
+            )
+            for _ in range(3)
+        ]
+        due_posts[0].hashtags.add(
+            hashtag, through_defaults=due_posts[0].get_hashtag_link_defaults()
+        )
+        future_post = sample_postponed_post(self.user)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            num_published = publish_due_posts()
+
+        self.assertEqual(num_published, 3)
+        self.assertEqual(
+            set(Post.objects.filter(is_published=True)), set(due_posts)
+        )
+        self.assertFalse(Post.objects.get(id=future_post.id).is_published)
+        self.assertTrue(
+            PostHashtag.objects.get(post=due_posts[0]).is_published
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=follower).count(), 3
+        )
+        self.assertEqual(publish_due_posts(), 0)
+
+    def test_update_postponed_post_bumps_schedule_version(self):
+        post = sample_postponed_post(self.user)
+
+        res = self.client.patch(
+            POSTPONED_POST_DETAIL_URL, {"text": "New text."}, format="json"
+        )
+        post.refresh_from_db()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(post.text, "New text.")
+        self.assertEqual(post.schedule_version, 1)
+
+    def test_stale_postponed_post_is_not_rescheduled(self):
+        post = sample_postponed_post(self.user)
+        stale_post = Post.objects.get(id=post.id)
+        post.publish()
+
+        with self.assertRaises(ValidationError):
+            stale_post.bump_schedule_version()
+
+        stale_post.refresh_from_db()
+        self.assertTrue(stale_post.is_published)
+
+    def test_postponed_post_is_published_once(self):
+        post = sample_postponed_post(self.user)
+        stale_post = Post.objects.get(id=post.id)
+        post.publish()
+
+        with self.assertRaises(ValidationError):
+            stale_post.publish()
+
+        post.refresh_from_db()
+        self.assertEqual(post.schedule_version, 1)
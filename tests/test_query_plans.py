@@ -0,0 +1,136 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from feed.models import Comment, Like, TimelineEntry
+from tests.test_hashtag_api import sample_hashtag
+from tests.test_post_api import sample_post
+from tests.test_postponed_post_api import sample_postponed_post
+from tests.test_user_info_api import sample_user, follow
+
+LARGE_TABLES = (
+    "feed_post",
+    "feed_post_hashtags",
+    "feed_like",
+    "feed_comment",
+    "feed_timelineentry",
+    "user_follow",
+)
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+
+
+@skipUnless(connection.vendor == "postgresql", "Requires PostgreSQL")
+class QueryPlanTests(TestCase):
+    """
+    Every query run by the hot endpoints can be served by an index.
+
+    Test tables are tiny, so sequential scans are disabled to make the
+    planner pick an index whenever one is usable.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            "test@test.com",
+            "testpass",
+        )
+        self.client.force_authenticate(self.user)
+
+        self.author = sample_user(email="author@user.com")
+        follow(follower=self.user, following=self.author)
+        follow(follower=self.author, following=self.user)
+
+        self.hashtag = sample_hashtag()
+        self.post = sample_post(self.author)
+        self.post.hashtags.add(
+            self.hashtag,
+            through_defaults=self.post.get_hashtag_link_defaults(),
+        )
+        sample_postponed_post(self.user)
+
+        Like.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(author=self.user, post=self.post, text="Hi")
+        TimelineEntry.objects.create(
+            user=self.user,
+            post=self.post,
+            published_at=self.post.published_at,
+        )
+
+    def assert_no_seq_scans(self, url: str) -> None:
+        with CaptureQueriesContext(connection) as context:
+            res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+            for query in context.captured_queries:
+                sql = query["sql"]
+                if not sql.startswith("SELECT"):
+                    continue
+
+                cursor.execute(f"EXPLAIN {sql}")
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                scanned_tables = set(SEQ_SCAN.findall(plan))
+
+                self.assertFalse(
+                    scanned_tables.intersection(LARGE_TABLES),
+                    f"Sequential scan in plan of {sql}:\n{plan}",
+                )
+
+    def test_followed_authors_posts(self):
+        self.assert_no_seq_scans(reverse("feed:post-followed-authors-posts"))
+
+    def test_liked_posts(self):
+        self.assert_no_seq_scans(reverse("feed:post-liked-posts"))
+
+    def test_post_detail(self):
+        self.assert_no_seq_scans(
+            reverse("feed:post-detail", args=[self.post.id])
+        )
+
+    def test_users_who_liked(self):
+        self.assert_no_seq_scans(
+            reverse("feed:post-users-who-liked", args=[self.post.id])
+        )
+
+    def test_hashtag_detail(self):
+        self.assert_no_seq_scans(
+            reverse("feed:hashtag-detail", args=[self.hashtag.id])
+        )
+
+    def test_hashtag_posts(self):
+        self.assert_no_seq_scans(
+            reverse("feed:hashtag-posts", args=[self.hashtag.id])
+        )
+
+    def test_postponed_posts(self):
+        self.assert_no_seq_scans(reverse("feed:postponed-post-list"))
+
+    def test_user_detail(self):
+        self.assert_no_seq_scans(
+            reverse("user:user-detail", args=[self.author.id])
+        )
+
+    def test_user_posts(self):
+        self.assert_no_seq_scans(
+            reverse("user:user-posts", args=[self.author.id])
+        )
+
+    def test_followers(self):
+        self.assert_no_seq_scans(
+            reverse("user:user-followers", args=[self.author.id])
+        )
+
+    def test_followings(self):
+        self.assert_no_seq_scans(
+            reverse("user:user-followings", args=[self.author.id])
+        )
@@ -1,19 +1,30 @@
+from unittest import mock
+
+from celery import group
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Exists, OuterRef, Prefetch
-from django.test import TestCase
+from django.db.models import Exists, OuterRef, QuerySet
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from feed.models import Post, Like
+from feed.models import Post, Like, TimelineEntry
+from feed.serializers import PostListSerializer
+from feed.viewer_state import ViewerState
+from social_media_api.redis_client import get_redis
+from user import graph
+from user.follows import toggle_follow
 from user.models import User, Follow
 from user.serializers import UserInfoListSerializer, UserInfoSerializer
+from user.tasks import verify_follow_counters
 
 USER_LIST_URL = reverse("user:user-list")
 USER_DETAIL_URL = reverse("user:user-detail", args=[2])
+USER_POSTS_URL = reverse("user:user-posts", args=[2])
 USER_FOLLOWERS_URL = reverse("user:user-followers", args=[1])
 USER_FOLLOWINGS_URL = reverse("user:user-followings", args=[1])
 USER_FOLLOW_TOGGLE_URL = reverse("user:user-follow-toggle", args=[2])
+USER_FOLLOW_MANY_URL = reverse("user:user-follow-many")
 
 
 def sample_user(**params) -> User:
@@ -24,33 +35,33 @@ def sample_user(**params) -> User:
     return get_user_model().objects.create(**defaults)
 
 
+def viewer_context(user: User) -> dict:
+    return {"viewer_state": ViewerState(user)}
+
+
 def follow(follower: User, following: User) -> None:
     Follow.objects.create(follower=follower, following=following)
 
 
-def get_annotated_user_detail(user: User) -> User:
-    posts = Prefetch(
-        "posts",
-        queryset=Post.objects.filter(is_published=True).annotate(
-            num_likes=Count("likes", distinct=True),
-            num_comments=Count("comments", distinct=True),
-            has_like_from_user=Exists(
-                Like.objects.filter(user=user, post=OuterRef("pk"))
-            ),
-        ),
-    )
-    users = get_user_model().objects.all().prefetch_related(posts)
-
-    users = users.annotate(
+def get_annotated_user_detail(user: User) -> QuerySet[User]:
+    users = get_user_model().objects.annotate(
         is_followed_by_user=Exists(
             Follow.objects.filter(follower=user, following=OuterRef("pk"))
         ),
-        num_followers=Count("followers", distinct=True),
-    ).annotate(num_followings=Count("followings", distinct=True))
+    )
 
     return users
 
 
+def get_annotated_user_posts(user: User, author: User) -> QuerySet[Post]:
+    posts = Post.objects.filter(author=author, is_published=True).annotate(
+        has_like_from_user=Exists(
+            Like.objects.filter(user=user, post=OuterRef("pk"))
+        ),
+    )
+    return posts
+
+
 class UnauthenticatedUserApiTests(TestCase):
     def setUp(self):
         self.client = APIClient()
@@ -109,11 +120,45 @@ class AuthenticatedUserApiTests(TestCase):
         res = self.client.get(USER_DETAIL_URL)
 
         users = get_annotated_user_detail(self.user)
-        serializer = UserInfoSerializer(users.get(id=following.id))
+        user = users.get(id=following.id)
+        user.first_page_posts = []
+        user.posts_next_url = None
+        serializer = UserInfoSerializer(
+            user, context=viewer_context(self.user)
+        )
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(res.data, serializer.data)
 
+    def test_retrieve_user_detail_embeds_first_page_of_posts(self):
+        author = sample_user()
+        posts = [
+            Post.objects.create(author=author, text="Sample text.")
+            for _ in range(3)
+        ]
+        Post.objects.create(
+            author=author, text="Sample text.", is_published=False
+        )
+
+        res = self.client.get(USER_DETAIL_URL, {"page_size": 2})
+
+        res_ids = [post["id"] for post in res.data["posts"]]
+        self.assertEqual(res_ids, [posts[2].id, posts[1].id])
+        self.assertIn(USER_POSTS_URL, res.data["posts_next_url"])
+
+        res = self.client.get(res.data["posts_next_url"])
+
+        expected_post = get_annotated_user_posts(self.user, author).get(
+            id=posts[0].id
+        )
+        serializer = PostListSerializer(
+            expected_post, context=viewer_context(self.user)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()["results"], [serializer.data])
+        self.assertIsNone(res.json()["next"])
+
     def test_get_followers_list(self):
         not_follower = sample_user(email="not_follower@user.com")
         follower1 = sample_user()
@@ -129,9 +174,9 @@ class AuthenticatedUserApiTests(TestCase):
         serisliser3 = UserInfoListSerializer(follower2)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertNotIn(serisliser1.data, res.data)
-        self.assertIn(serisliser2.data, res.data)
-        self.assertIn(serisliser3.data, res.data)
+        self.assertNotIn(serisliser1.data, res.data["results"])
+        self.assertIn(serisliser2.data, res.data["results"])
+        self.assertIn(serisliser3.data, res.data["results"])
 
     def test_get_followings_list(self):
         not_following = sample_user(email="not_follower@user.com")
@@ -148,9 +193,27 @@ class AuthenticatedUserApiTests(TestCase):
         serisliser3 = UserInfoListSerializer(following2)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertNotIn(serisliser1.data, res.data)
-        self.assertIn(serisliser2.data, res.data)
-        self.assertIn(serisliser3.data, res.data)
+        self.assertNotIn(serisliser1.data, res.data["results"])
+        self.assertIn(serisliser2.data, res.data["results"])
+        self.assertIn(serisliser3.data, res.data["results"])
+
+    def test_followers_are_paginated_by_follow_time(self):
+        followers = [sample_user() for _ in range(3)]
+
+        for follower in (followers[1], followers[0], followers[2]):
+            follow(follower=follower, following=self.user)
+
+        res = self.client.get(USER_FOLLOWERS_URL, {"page_size": 2})
+
+        res_ids = [user["id"] for user in res.json()["results"]]
+        self.assertEqual(res_ids, [followers[2].id, followers[0].id])
+        self.assertNotIn("count", res.json())
+
+        res = self.client.get(res.json()["next"])
+
+        res_ids = [user["id"] for user in res.json()["results"]]
+        self.assertEqual(res_ids, [followers[1].id])
+        self.assertIsNone(res.json()["next"])
 
     def test_get_follow_toggle(self):
         following = sample_user(email="not_follower@user.com")
@@ -172,3 +235,150 @@ class AuthenticatedUserApiTests(TestCase):
                 follower=self.user, following=following
             ).exists()
         )
+
+    def test_follow_toggle_updates_follow_counts(self):
+        following = sample_user(email="not_follower@user.com")
+
+        self.client.get(USER_FOLLOW_TOGGLE_URL)
+        self.user.refresh_from_db()
+        following.refresh_from_db()
+
+        self.assertEqual(self.user.following_count, 1)
+        self.assertEqual(following.follower_count, 1)
+
+        self.client.get(USER_FOLLOW_TOGGLE_URL)
+        self.user.refresh_from_db()
+        following.refresh_from_db()
+
+        self.assertEqual(self.user.following_count, 0)
+        self.assertEqual(following.follower_count, 0)
+
+    def test_follow_many(self):
+        followed = sample_user()
+        toggle_follow(self.user.id, followed.id)
+        new_followings = [sample_user(), sample_user()]
+        user_ids = [self.user.id, followed.id, 999] + [
+            user.id for user in new_followings
+        ]
+
+        res = self.client.post(
+            USER_FOLLOW_MANY_URL, {"user_ids": user_ids}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            res.data["user_ids"], [user.id for user in new_followings]
+        )
+        self.assertEqual(Follow.objects.filter(follower=self.user).count(), 3)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 3)
+
+        for user in new_followings + [followed]:
+            user.refresh_from_db()
+            self.assertEqual(user.follower_count, 1)
+
+    def test_follow_many_backfills_timelines_in_one_group(self):
+        authors = [sample_user(), sample_user()]
+        posts = [
+            Post.objects.create(author=author, text="Sample text.")
+            for author in authors
+        ]
+
+        with mock.patch("feed.timeline.group", wraps=group) as group_mock:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    USER_FOLLOW_MANY_URL,
+                    {"user_ids": [author.id for author in authors]},
+                    format="json",
+                )
+
+        group_mock.assert_called_once()
+        self.assertEqual(
+            set(
+                TimelineEntry.objects.filter(user=self.user).values_list(
+                    "post_id", flat=True
+                )
+            ),
+            {post.id for post in posts},
+        )
+
+    def test_follow_many_requires_user_ids(self):
+        res = self.client.post(
+            USER_FOLLOW_MANY_URL, {"user_ids": []}, format="json"
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_verify_follow_counters(self):
+        following = sample_user()
+        follow(follower=self.user, following=following)
+
+        num_repaired = verify_follow_counters()
+        following.refresh_from_db()
+
+        self.assertEqual(num_repaired, 2)
+        self.assertEqual(following.follower_count, 1)
+
+
+@override_settings(REDIS_URL=None, SOCIAL_GRAPH_CACHE=True)
+class SocialGraphCacheTests(TestCase):
+    def setUp(self):
+        get_redis().flushdb()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email="test@test.com",
+            password="testpass",
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_graph_queries_are_served_from_cache(self):
+        following1 = sample_user()
+        following2 = sample_user()
+        follow(follower=self.user, following=following1)
+        follow(follower=following2, following=following1)
+        graph.get_following_ids(self.user.id)
+        graph.get_following_ids(following2.id)
+        graph.get_follower_ids(following1.id)
+
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.user.id, following1.id))
+            self.assertFalse(graph.is_following(self.user.id, following2.id))
+            self.assertEqual(graph.count_followers(following1.id), 2)
+            self.assertEqual(graph.count_following(self.user.id), 1)
+            self.assertEqual(
+                graph.get_common_following_ids(self.user.id, following2.id),
+                {following1.id},
+            )
+
+    def test_follow_toggle_maintains_cached_graph(self):
+        following = sample_user()
+        self.assertEqual(graph.get_following_ids(self.user.id), set())
+        self.assertEqual(graph.get_follower_ids(following.id), set())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(USER_FOLLOW_TOGGLE_URL)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                graph.get_following_ids(self.user.id), {following.id}
+            )
+            self.assertEqual(
+                graph.get_follower_ids(following.id), {self.user.id}
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(USER_FOLLOW_TOGGLE_URL)
+
+        self.assertEqual(graph.get_following_ids(self.user.id), set())
+        self.assertEqual(graph.get_follower_ids(following.id), set())
+
+    def test_user_deletion_maintains_cached_graph(self):
+        following = sample_user()
+        follow(follower=self.user, following=following)
+        graph.get_follower_ids(following.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+
+        self.assertEqual(graph.get_follower_ids(following.id), set())
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F, Q
+
+from feed import timeline
+from feed.counters import add_clamped, count_subquery
+from feed.tasks import backfill_followers_timelines
+from user.models import Follow
+
+
+def change_follow_counts(
+    follower_id: int, following_id: int, delta: int
+) -> None:
+    get_user_model().objects.filter(id=follower_id).update(
+        following_count=add_clamped("following_count", delta)
+    )
+    get_user_model().objects.filter(id=following_id).update(
+        follower_count=add_clamped("follower_count", delta)
+    )
+
+
+def reconcile_follow_counters(batch_size: int = 1000) -> int:
+    """
+    Recount followers and followings of users whose counters drifted.
+    Returns the number of repaired users.
+    """
+    drifted = (
+        get_user_model()
+        .objects.annotate(
+            actual_follower_count=count_subquery(Follow, "following"),
+            actual_following_count=count_subquery(Follow, "follower"),
+        )
+        .filter(
+            ~Q(follower_count=F("actual_follower_count"))
+            | ~Q(following_count=F("actual_following_count"))
+        )
+        .order_by()
+        .values_list(
+            "id",
+            "follower_count",
+            "actual_follower_count",
+            "actual_following_count",
+        )
+    )
+
+    num_repaired = 0
+    batch = []
+
+    for (
+        user_id,
+        follower_count_before,
+        follower_count,
+        following_count,
+    ) in drifted.iterator(batch_size):
+        if timeline.is_demoted(follower_count_before, follower_count):
+            transaction.on_commit(
+                lambda user_id=user_id: backfill_followers_timelines.delay(
+                    user_id
+                )
+            )
+
+        batch.append(
+            get_user_model()(
+                id=user_id,
+                follower_count=follower_count,
+                following_count=following_count,
+            )
+        )
+
+        if len(batch) == batch_size:
+            get_user_model().objects.bulk_update(
+                batch, ["follower_count", "following_count"]
+            )
+            num_repaired += len(batch)
+            batch = []
+
+    if batch:
+        get_user_model().objects.bulk_update(
+            batch, ["follower_count", "following_count"]
+        )
+        num_repaired += len(batch)
+
+    return num_repaired
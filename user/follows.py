@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from feed import timeline
+from feed.tasks import backfill_followers_timelines
+from user import graph
+from user.counters import change_follow_counts
+from user.models import Follow
+
+
+def toggle_follow(follower_id: int, following_id: int) -> bool:
+    """
+    Follow the user or remove the existing follow relation.
+    Returns whether the user is followed after the toggle.
+    """
+    with transaction.atomic():
+        num_deleted, _ = Follow.objects.filter(
+            follower_id=follower_id, following_id=following_id
+        ).delete()
+
+        if num_deleted:
+            change_follow_counts(follower_id, following_id, -1)
+            transaction.on_commit(
+                lambda: graph.remove_follow(follower_id, following_id)
+            )
+
+            # The row stays locked by the update, so only one of
+            # concurrent unfollows sees the author crossing the threshold.
+            follower_count = (
+                get_user_model()
+                .objects.filter(id=following_id)
+                .values_list("follower_count", flat=True)
+                .first()
+            )
+            if follower_count is not None and timeline.is_demoted(
+                follower_count + 1, follower_count
+            ):
+                transaction.on_commit(
+                    lambda: backfill_followers_timelines.delay(following_id)
+                )
+
+            return False
+
+        try:
+            with transaction.atomic():
+                Follow.objects.create(
+                    follower_id=follower_id, following_id=following_id
+                )
+        except IntegrityError:
+            # A concurrent toggle has already followed the user
+            return True
+
+        change_follow_counts(follower_id, following_id, 1)
+        transaction.on_commit(
+            lambda: graph.add_follows(follower_id, [following_id])
+        )
+        return True
+
+
+def follow_many(
+    follower_id: int, following_ids: list[int], batch_size: int = 1000
+) -> list[int]:
+    """
+    Follow all given users at once, skipping the follower itself,
+    unknown users and already followed users.
+    Returns ids of the newly followed users.
+    """
+    following_ids = set(
+        get_user_model()
+        .objects.filter(id__in=following_ids)
+        .exclude(id=follower_id)
+        .values_list("id", flat=True)
+    )
+
+    with transaction.atomic():
+        already_followed = set(
+            Follow.objects.filter(
+                follower_id=follower_id, following_id__in=following_ids
+            ).values_list("following_id", flat=True)
+        )
+        followed_ids = sorted(following_ids - already_followed)
+
+        Follow.objects.bulk_create(
+            [
+                Follow(follower_id=follower_id, following_id=following_id)
+                for following_id in followed_ids
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+
+        # Rows skipped as conflicting with a concurrent follow are still
+        # counted, verify_follow_counters repairs that rare drift.
+        get_user_model().objects.filter(id=follower_id).update(
+            following_count=F("following_count") + len(followed_ids)
+        )
+        get_user_model().objects.filter(id__in=followed_ids).update(
+            follower_count=F("follower_count") + 1
+        )
+        transaction.on_commit(
+            lambda: graph.add_follows(follower_id, followed_ids)
+        )
+
+    return followed_ids
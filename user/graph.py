@@ -0,0 +1,172 @@
+from collections.abc import Callable, Iterable
+
+from django.conf import settings
+
+from social_media_api.redis_client import get_redis
+from user.models import Follow
+
+FOLLOWING_KEY = "graph:following:{}"
+FOLLOWERS_KEY = "graph:followers:{}"
+GRAPH_TTL = 24 * 60 * 60
+
+# Cached sets always contain the sentinel, which tells an empty set
+# apart from a set which is not loaded yet. User ids start from 1.
+SENTINEL = "0"
+
+
+def is_enabled() -> bool:
+    return settings.SOCIAL_GRAPH_CACHE
+
+
+def _following_ids_from_db(user_id: int) -> Iterable[int]:
+    return Follow.objects.filter(follower_id=user_id).values_list(
+        "following_id", flat=True
+    )
+
+
+def _follower_ids_from_db(user_id: int) -> Iterable[int]:
+    return Follow.objects.filter(following_id=user_id).values_list(
+        "follower_id", flat=True
+    )
+
+
+def _load(key: str, get_ids: Callable[[], Iterable[int]]) -> str:
+    """
+    Fill the cached set from the database unless it is cached.
+    Sets expire after GRAPH_TTL, which bounds the staleness left by
+    relations committed while a set was being loaded.
+    """
+    redis = get_redis()
+
+    if not redis.exists(key):
+        redis.sadd(key, SENTINEL, *get_ids())
+        redis.expire(key, GRAPH_TTL)
+
+    return key
+
+
+def _following_key(user_id: int) -> str:
+    return _load(
+        FOLLOWING_KEY.format(user_id),
+        lambda: _following_ids_from_db(user_id),
+    )
+
+
+def _followers_key(user_id: int) -> str:
+    return _load(
+        FOLLOWERS_KEY.format(user_id),
+        lambda: _follower_ids_from_db(user_id),
+    )
+
+
+def _to_ids(members: Iterable[str]) -> set[int]:
+    return {int(member) for member in members if member != SENTINEL}
+
+
+def get_following_ids(user_id: int) -> set[int]:
+    if not is_enabled():
+        return set(_following_ids_from_db(user_id))
+
+    return _to_ids(get_redis().smembers(_following_key(user_id)))
+
+
+def get_follower_ids(user_id: int) -> set[int]:
+    if not is_enabled():
+        return set(_follower_ids_from_db(user_id))
+
+    return _to_ids(get_redis().smembers(_followers_key(user_id)))
+
+
+def filter_followed(follower_id: int, user_ids: Iterable[int]) -> set[int]:
+    """Return those of user_ids which are followed by the follower."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+
+    if not is_enabled():
+        return set(
+            _following_ids_from_db(follower_id).filter(
+                following_id__in=user_ids
+            )
+        )
+
+    flags = get_redis().smismember(_following_key(follower_id), user_ids)
+    return {user_id for user_id, flag in zip(user_ids, flags) if flag}
+
+
+def is_following(follower_id: int, following_id: int) -> bool:
+    return following_id in filter_followed(follower_id, [following_id])
+
+
+def count_following(user_id: int) -> int:
+    if not is_enabled():
+        return Follow.objects.filter(follower_id=user_id).count()
+
+    return get_redis().scard(_following_key(user_id)) - 1
+
+
+def count_followers(user_id: int) -> int:
+    if not is_enabled():
+        return Follow.objects.filter(following_id=user_id).count()
+
+    return get_redis().scard(_followers_key(user_id)) - 1
+
+
+def get_common_following_ids(user_id: int, other_user_id: int) -> set[int]:
+    """Ids of the users followed by both users."""
+    if not is_enabled():
+        return get_following_ids(user_id) & get_following_ids(other_user_id)
+
+    return _to_ids(
+        get_redis().sinter(
+            _following_key(user_id), _following_key(other_user_id)
+        )
+    )
+
+
+def add_follows(follower_id: int, following_ids: Iterable[int]) -> None:
+    """
+    Add committed follow relations to the cached sets. Sets which are
+    not cached are left alone, they are loaded on the next read.
+    """
+    if not is_enabled():
+        return
+
+    redis = get_redis()
+    following_ids = list(following_ids)
+
+    following_key = FOLLOWING_KEY.format(follower_id)
+    if following_ids and redis.exists(following_key):
+        redis.sadd(following_key, *following_ids)
+
+    for following_id in following_ids:
+        followers_key = FOLLOWERS_KEY.format(following_id)
+        if redis.exists(followers_key):
+            redis.sadd(followers_key, follower_id)
+
+
+def remove_follow(follower_id: int, following_id: int) -> None:
+    """Remove a deleted follow relation from the cached sets."""
+    if not is_enabled():
+        return
+
+    redis = get_redis()
+    redis.srem(FOLLOWING_KEY.format(follower_id), following_id)
+    redis.srem(FOLLOWERS_KEY.format(following_id), follower_id)
+
+
+def forget_user(
+    user_id: int, follower_ids: Iterable[int], following_ids: Iterable[int]
+) -> None:
+    """Remove a deleted user from the cached sets of the related users."""
+    if not is_enabled():
+        return
+
+    redis = get_redis()
+    redis.delete(FOLLOWING_KEY.format(user_id), FOLLOWERS_KEY.format(user_id))
+
+    for follower_id in follower_ids:
+        redis.srem(FOLLOWING_KEY.format(follower_id), user_id)
+
+    for following_id in following_ids:
+        redis.srem(FOLLOWERS_KEY.format(following_id), user_id)
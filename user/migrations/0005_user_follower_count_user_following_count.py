@@ -0,0 +1,47 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:35
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(model, field):
+    counts = (
+        model.objects.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("id"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), 0)
+
+
+def populate_counters(apps, schema_editor):
+    User = apps.get_model("user", "User")
+    Follow = apps.get_model("user", "Follow")
+
+    User.objects.update(
+        follower_count=count_subquery(Follow, "following"),
+        following_count=count_subquery(Follow, "follower"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0004_user_profile_image"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="follower_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="user",
+            name="following_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
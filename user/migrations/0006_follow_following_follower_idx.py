@@ -0,0 +1,20 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0005_user_follower_count_user_following_count"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["following", "follower"],
+                name="follow_following_follower_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.2 on 2026-10-17 04:56
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0006_follow_following_follower_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="follow",
+            name="created_at",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["following", "-created_at", "-id"],
+                name="follow_following_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="follow",
+            index=models.Index(
+                fields=["follower", "-created_at", "-id"],
+                name="follow_follower_created_idx",
+            ),
+        ),
+    ]
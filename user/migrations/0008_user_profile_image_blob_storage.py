@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-17 05:05
+
+import social_media_api.storage
+import user.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0007_follow_created_at"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="profile_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=social_media_api.storage.get_blob_storage,
+                upload_to=user.models.profile_image_file_path,
+            ),
+        ),
+    ]
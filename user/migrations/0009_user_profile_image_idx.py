@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-17 06:00
+
+import social_media_api.storage
+import user.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0008_user_profile_image_blob_storage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="user",
+            name="profile_image",
+            field=models.ImageField(
+                blank=True,
+                db_index=True,
+                null=True,
+                storage=social_media_api.storage.get_blob_storage,
+                upload_to=user.models.profile_image_file_path,
+            ),
+        ),
+    ]
@@ -10,6 +10,8 @@ from django.urls import reverse
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
 
+from social_media_api.storage import get_blob_storage
+
 
 class UserManager(BaseUserManager):
     """Define a model manager for User model with email as authentication field."""
@@ -46,9 +48,9 @@ class UserManager(BaseUserManager):
 
 
 def profile_image_file_path(instance, filename) -> str:
-    _, extension = filename.split(".")
+    _, extension = os.path.splitext(filename)
 
-    filename = f"{slugify(instance.username)}-{uuid.uuid4()}.{extension}"
+    filename = f"{slugify(instance.username)}-{uuid.uuid4()}{extension}"
 
     return os.path.join("uploads/profile_images/", filename)
 
@@ -73,8 +75,14 @@ class User(AbstractUser):
         },
     )
     profile_image = models.ImageField(
-        blank=True, null=True, upload_to=profile_image_file_path
+        blank=True,
+        null=True,
+        upload_to=profile_image_file_path,
+        storage=get_blob_storage,
+        db_index=True,
     )
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return self.get_full_name()
@@ -94,6 +102,21 @@ class Follow(models.Model):
     following = models.ForeignKey(
         get_user_model(), on_delete=models.CASCADE, related_name="followers"
     )
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         unique_together = ("follower", "following")
+        indexes = [
+            models.Index(
+                fields=("following", "follower"),
+                name="follow_following_follower_idx",
+            ),
+            models.Index(
+                fields=("following", "-created_at", "-id"),
+                name="follow_following_created_idx",
+            ),
+            models.Index(
+                fields=("follower", "-created_at", "-id"),
+                name="follow_follower_created_idx",
+            ),
+        ]
@@ -5,16 +5,20 @@ from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from feed.serializers import get_full_url, PostListSerializer
+from feed.viewer_state import get_viewer_state
 
 
 class UserInfoSerializer(serializers.ModelSerializer):
-    num_followers = serializers.IntegerField()
-    num_followings = serializers.IntegerField()
+    num_followers = serializers.IntegerField(source="follower_count")
+    num_followings = serializers.IntegerField(source="following_count")
     followers_url = serializers.SerializerMethodField()
     followings_url = serializers.SerializerMethodField()
-    is_followed_by_user = serializers.BooleanField()
+    is_followed_by_user = serializers.SerializerMethodField()
     follow_toggle = serializers.SerializerMethodField()
-    posts = PostListSerializer(many=True, read_only=True)
+    posts = PostListSerializer(
+        source="first_page_posts", many=True, read_only=True
+    )
+    posts_next_url = serializers.URLField(read_only=True, allow_null=True)
 
     @staticmethod
     @extend_schema_field(OpenApiTypes.URI_TPL)
@@ -30,6 +34,9 @@ class UserInfoSerializer(serializers.ModelSerializer):
             reverse("user:user-followings", kwargs={"pk": instance.id})
         )
 
+    def get_is_followed_by_user(self, instance) -> bool:
+        return get_viewer_state(self.context).is_following(instance.id)
+
     @extend_schema_field(OpenApiTypes.URI_TPL)
     def get_follow_toggle(self, instance) -> str | None:
         if self.context.get("user") == instance:
@@ -54,6 +61,7 @@ class UserInfoSerializer(serializers.ModelSerializer):
             "is_followed_by_user",
             "follow_toggle",
             "posts",
+            "posts_next_url",
         )
 
 
@@ -77,6 +85,14 @@ class UserInfoListSerializer(serializers.ModelSerializer):
         )
 
 
+class FollowManySerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=1000,
+    )
+
+
 class ManageUserProfileSerializer(serializers.ModelSerializer):
     profile_image = serializers.ImageField(read_only=True)
     profile_url = serializers.SerializerMethodField()
@@ -0,0 +1,30 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from user import graph
+from user.models import Follow
+
+
+@receiver(pre_delete, sender=get_user_model())
+def forget_deleted_user(sender, instance, **kwargs):
+    """Remove the deleted user from the cached social graph."""
+    if not graph.is_enabled():
+        return
+
+    follower_ids = list(
+        Follow.objects.filter(following=instance).values_list(
+            "follower_id", flat=True
+        )
+    )
+    following_ids = list(
+        Follow.objects.filter(follower=instance).values_list(
+            "following_id", flat=True
+        )
+    )
+    user_id = instance.id
+
+    transaction.on_commit(
+        lambda: graph.forget_user(user_id, follower_ids, following_ids)
+    )
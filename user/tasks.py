@@ -0,0 +1,8 @@
+from social_media_api.celery import app
+
+from user.counters import reconcile_follow_counters
+
+
+@app.task
+def verify_follow_counters() -> int:
+    return reconcile_follow_counters()
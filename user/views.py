@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Q, Count, Prefetch, Exists, OuterRef
+from django.db import transaction
+from django.db.models import Q, QuerySet
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 from drf_spectacular.types import OpenApiTypes
@@ -17,9 +18,16 @@ from rest_framework.response import Response
 from rest_framework.settings import api_settings
 from rest_framework.views import APIView
 
-from feed.models import Like, Post
+from feed import timeline
+from feed.models import Post
+from feed.pagination import FollowPagination, PostPagination
+from feed.serializers import PostListSerializer
+from feed.tasks import backfill_timeline, purge_timeline
+from social_media_api.uploads import ImageUploadMixin
+from user.follows import follow_many, toggle_follow
 from user.models import Follow
 from user.serializers import (
+    FollowManySerializer,
     UserInfoSerializer,
     UserInfoListSerializer,
     ManageUserProfileSerializer,
@@ -44,33 +52,6 @@ class UserInfoViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         queryset = get_user_model().objects.all()
 
-        if self.action == "retrieve":
-            user = self.request.user
-            retrieved_user = self.kwargs.get("pk")
-
-            posts = Prefetch(
-                "posts",
-                queryset=Post.objects.filter(is_published=True)
-                .annotate(
-                    num_likes=Count("likes", distinct=True),
-                    num_comments=Count("comments", distinct=True),
-                    has_like_from_user=Exists(
-                        Like.objects.filter(user=user, post=OuterRef("pk"))
-                    ),
-                )
-                .prefetch_related("images", "hashtags"),
-            )
-            queryset = queryset.prefetch_related(posts)
-
-            queryset = queryset.annotate(
-                is_followed_by_user=Exists(
-                    Follow.objects.filter(
-                        follower=user, following=retrieved_user
-                    )
-                ),
-                num_followers=Count("followers", distinct=True),
-            ).annotate(num_followings=Count("followings", distinct=True))
-
         if self.action == "list":
             search_string = self.request.query_params.get("search", None)
             if search_string:
@@ -86,8 +67,25 @@ class UserInfoViewSet(viewsets.ReadOnlyModelViewSet):
         if self.action in ["list", "followers", "followings"]:
             return UserInfoListSerializer
 
+        if self.action == "posts":
+            return PostListSerializer
+
+        if self.action == "follow_many":
+            return FollowManySerializer
+
         return UserInfoSerializer
 
+    def get_posts_queryset(self, author) -> QuerySet[Post]:
+        """
+        Published posts of the author with the relations post lists
+        render. Like and comment counts are stored on the posts.
+        """
+        return (
+            Post.objects.filter(author=author, is_published=True)
+            .select_related("author")
+            .prefetch_related("images__renditions", "hashtags")
+        )
+
     def get_serializer_context(self):
         """Extra context provided to the serializer class."""
 
@@ -98,31 +96,47 @@ class UserInfoViewSet(viewsets.ReadOnlyModelViewSet):
 
         return context
 
+    def get_paginated_users(self, follow_relations, user_field: str):
+        """Paginate users of follow relations, newest relations first."""
+        paginator = FollowPagination()
+        page = paginator.paginate_queryset(
+            follow_relations.select_related(user_field), self.request
+        )
+        users = [getattr(relation, user_field) for relation in page]
+        serializer = self.get_serializer(users, many=True)
+
+        return paginator.get_paginated_response(serializer.data)
+
     @action(methods=["GET"], detail=True, url_path="followers")
     def followers(self, request, pk=None):
         """Endpoint for getting a list of user's followers."""
         retrieved_user = self.get_object()
 
-        follow_relations = Follow.objects.filter(following=retrieved_user)
-        followers = get_user_model().objects.filter(
-            followings__in=follow_relations
+        return self.get_paginated_users(
+            Follow.objects.filter(following=retrieved_user), "follower"
         )
 
-        serializer = UserInfoListSerializer(followers, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
     @action(methods=["GET"], detail=True, url_path="followings")
     def followings(self, request, pk=None):
         """Endpoint for getting a list of user's followings."""
         retrieved_user = self.get_object()
 
-        follow_relations = Follow.objects.filter(follower=retrieved_user)
-        followings = get_user_model().objects.filter(
-            followers__in=follow_relations
+        return self.get_paginated_users(
+            Follow.objects.filter(follower=retrieved_user), "following"
+        )
+
+    @action(methods=["GET"], detail=True, url_path="posts")
+    def posts(self, request, pk=None):
+        """Endpoint for getting a list of user's published posts."""
+        retrieved_user = self.get_object()
+
+        paginator = PostPagination()
+        posts = paginator.paginate_queryset(
+            self.get_posts_queryset(retrieved_user), request, view=self
         )
+        serializer = self.get_serializer(posts, many=True)
 
-        serializer = UserInfoListSerializer(followings, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=True, url_path="follow_toggle")
     def follow_toggle(self, request, pk=None):
@@ -130,34 +144,70 @@ class UserInfoViewSet(viewsets.ReadOnlyModelViewSet):
         retrieved_user = self.get_object()
         active_user = request.user
 
-        is_followed_by_user = Follow.objects.filter(
-            follower=active_user, following=retrieved_user
-        ).exists()
-
-        if is_followed_by_user:
-            follow_relation = Follow.objects.filter(
-                follower=active_user, following=retrieved_user
-            )
-            follow_relation.delete()
+        if toggle_follow(active_user.id, retrieved_user.id):
+            timeline_task = backfill_timeline
         else:
-            Follow.objects.create(
-                follower=active_user, following=retrieved_user
-            )
+            timeline_task = purge_timeline
+
+        transaction.on_commit(
+            lambda: timeline_task.delay(active_user.id, retrieved_user.id)
+        )
 
         return HttpResponseRedirect(
             request.META.get("HTTP_REFERER", retrieved_user.get_absolute_url())
         )
 
+    @extend_schema(responses={201: FollowManySerializer})
+    @action(
+        methods=["POST"],
+        detail=False,
+        url_path="follow_many",
+    )
+    def follow_many(self, request):
+        """Endpoint for following a list of users at once."""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        active_user = request.user
+        followed_ids = follow_many(
+            active_user.id, serializer.validated_data["user_ids"]
+        )
+
+        if followed_ids:
+            transaction.on_commit(
+                lambda: timeline.queue_backfills(active_user.id, followed_ids)
+            )
+
+        return Response(
+            {"user_ids": followed_ids}, status=status.HTTP_201_CREATED
+        )
+
     @extend_schema(
         parameters=[
             OpenApiParameter("id", OpenApiTypes.INT, OpenApiParameter.PATH)
         ]
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(self, request, *args, **kwargs)
+        instance = self.get_object()
+
+        # Only the first page of posts is embedded into the profile,
+        # the rest is available via the posts endpoint.
+        paginator = PostPagination()
+        instance.first_page_posts = paginator.paginate_first_page(
+            self.get_posts_queryset(instance),
+            request,
+            url=request.build_absolute_uri(
+                reverse("user:user-posts", kwargs={"pk": instance.id})
+            ),
+        )
+        instance.posts_next_url = paginator.get_next_link()
+
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
 
 
 class ManageUserProfileViewSet(
+    ImageUploadMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
     viewsets.GenericViewSet,